@@ -1,18 +1,132 @@
+import asyncio
+import functools
+import gc
+import heapq
+import inspect
+import math
+import mmap
+import os
+import pickle
+import random
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+from array import array
+
 
 class CacheNode(object):
     """ Node object, PARAMETERS:
         ========================
         [value = data to be held in the Node (here a number),
         (next, previous) = connections in a priority queue,
-        key = hash value to store node object inside a lookup dict]
+        key = hash value to store node object inside a lookup dict,
+        expires = clock time after which the node is stale (None = never),
+        weight = size of value as returned by the caches sizer function]
         
         """
     
+    __slots__ = ("value", "next", "previous", "key", "expires", "weight")
+    
     def __init__(self, value):
         self.value = value
         self.next = None
         self.previous = None
         self.key = None
+        self.expires = None
+        self.weight = 0
+
+
+class _Snapshot(object):
+    """ Memory mapped snapshot file written by LRU_Cache.save.
+        File layout (all integers little endian unsigned 64 bit):
+            header  = MAGIC, number of entries, keys offset, keys length, value offsets offset,
+                      capacity of the saved cache (UNLIMITED for no limit)
+            values  = pickled values, one after another, in queue order (start -> end)
+            keys    = one pickle of the list of all keys (same order)
+            offsets = number of entries + 1 positions in the file, value i spans offsets[i]:offsets[i+1]
+        """
+    
+    MAGIC = b"LRUSNAP2"
+    HEADER = struct.Struct("<8sQQQQQ")
+    UNLIMITED = 2**64 - 1
+    
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, keys_offset, keys_length, offsets_offset, capacity = self.HEADER.unpack_from(self.mm, 0)
+        if magic != self.MAGIC:
+            raise ValueError("{} is not an LRU_Cache snapshot".format(path))
+        self.capacity = None if capacity == self.UNLIMITED else capacity
+        self.keys_offset = keys_offset
+        self.keys_length = keys_length
+        self.offsets = array("Q")
+        self.offsets.frombytes(self.mm[offsets_offset:offsets_offset + 8 * (self.count + 1)])
+        if sys.byteorder == "big":
+            self.offsets.byteswap()
+    
+    def keys(self):
+        return pickle.loads(self.mm[self.keys_offset:self.keys_offset + self.keys_length])
+    
+    def raw(self, index):
+        return self.mm[self.offsets[index]:self.offsets[index + 1]]
+
+
+class _SnapshotValue(object):
+    """ Placeholder for a value that is still undecoded inside a snapshot file """
+    
+    __slots__ = ("snapshot", "index")
+    
+    def __init__(self, snapshot, index):
+        self.snapshot = snapshot
+        self.index = index
+    
+    def decode(self):
+        return pickle.loads(self.snapshot.raw(self.index))
+
+
+class LatencyHistogram(object):
+    """ Low overhead latency histogram with power of two buckets: a sample of n nanoseconds
+        is counted in bucket n.bit_length(), so recording is a single list increment.
+        Percentiles are reported as the upper bound of their bucket (at most 2x too high).
+        """
+    
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.count = 0
+    
+    def record(self, nanoseconds):
+        self.buckets[nanoseconds.bit_length()] += 1
+        self.count += 1
+    
+    def percentile(self, p):
+        """ Upper bound (in nanoseconds) of the p-th percentile, None if nothing was recorded """
+        if self.count == 0:
+            return None
+        target = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return 1 << bucket
+
+
+class CacheStats(object):
+    """ Counters and sampled get / set latencies of a cache.
+        PARAMETERS:
+        ==========
+        self.hits / self.misses = counted on every get (and per key on get_many)
+        self.sample_every = only every n-th get / set call is timed
+        self.get_latency / self.set_latency = LatencyHistogram of the timed calls
+        """
+    
+    def __init__(self, sample_every=64):
+        self.hits = 0
+        self.misses = 0
+        self.sample_every = sample_every
+        self.get_latency = LatencyHistogram()
+        self.set_latency = LatencyHistogram()
 
 
 class LRU_Cache(object):
@@ -20,69 +134,991 @@ class LRU_Cache(object):
         Uses a mapping (dict) for fast (O(1)) lookups by storing objects of type -> CacheNode
         and a queue to sort priority of objects. Least recently used data (not previously set or looked-up)
         will be removed to free space for new items.
+        Optionally entries expire after a time to live (ttl) and the cache is limited by the
+        total weight of its values instead of (or on top of) the number of entries.
         PARAMETERS:
         ==========
-        self.capacity = size limit (int)
+        self.capacity = size limit (int), None for no limit on the number of entries
         self.cache = mapping for instant .get() method
         self.start / self.end = beginning and ending of least recently used items in a queue
         [Node items will be appended to self.end, while beeing removed from self.start]
+        self.max_weight = limit for the total weight of all values (None = no limit)
+        self.sizer = function returning the weight of a value (default: sys.getsizeof)
+        self.total_weight = current total weight of all values
+        self.ttl = default time to live in seconds for new entries (None = never expire)
+        self.clock = function returning the current time in seconds
+        self.expiry = MinHeap of (expires, counter, node) tuples, so that sweep() only
+                      looks at entries that are actually due
+        self.admission = optional admission filter (e.g. TinyLFU): records every get and decides whether
+                         a new key may evict the least recently used one once the cache is full
+        self.evictions = number of entries removed to make room for new ones
+        self.stats = CacheStats object while statistics are switched on (see enable_stats), else None
         """
     
-    def __init__(self, capacity):
-        self.capacity = capacity
+    def __init__(self, capacity, max_weight=None, sizer=None, ttl=None, clock=time.monotonic,
+                 admission=None, stats=False):
+        self.capacity = float("inf") if capacity is None else capacity
         self.cache = {}
         self.start = None; self.end = None
+        self.max_weight = max_weight
+        self.sizer = sys.getsizeof if sizer is None else sizer
+        self.total_weight = 0
+        self.ttl = ttl
+        self.clock = clock
+        self.expiry = []
+        self._expiry_counter = 0
+        self.admission = admission
+        self.evictions = 0
+        self.stats = None
+        if stats:
+            self.enable_stats()
     
     def get(self, key):
-        """ Returns the value of a node mapped to key. If key does not exist, returns -1.
+        """ Returns the value of a node mapped to key. If key does not exist (or expired), returns -1.
             Also resorting queue items, so that most recently looked up node is set to the end of the queue.
             """
+        if self.admission is not None:
+            self.admission.record(key)
         
         if key in self.cache:
             curr_node = self.cache[key]
-            if curr_node == self.start:
-                self.start = self.start.next
-            curr_node_prev = curr_node.previous
-            curr_node_next = curr_node.next
-            if curr_node_prev is not None:
-                curr_node_prev.next = curr_node_next
-            if curr_node_next is not None:
-                curr_node_next.previous = curr_node_prev
-            curr_node.next = None
-            curr_node.previous = None
-            self.end.next = curr_node
-            self.end.next.previous = self.end
-            self.end = self.end.next
-            return self.cache[key].value
+            if curr_node.expires is not None and curr_node.expires <= self.clock():
+                self._remove(curr_node)
+                return -1
+            if curr_node is not self.end:
+                self._unlink(curr_node)
+                self._append(curr_node)
+            if curr_node.value.__class__ is _SnapshotValue:
+                curr_node.value = curr_node.value.decode()
+            return curr_node.value
     
         else:
             return -1
 
-    def set(self, key, value):
+    def set(self, key, value, ttl=None):
         """ Inserts data (value) in a CacheNode object to the mapping and to the end of the queue.
-            If mapping size limit is reached, removes the object at the start of the queue
-            (least recently used) from both the queue and the mapping (dict).
+            If mapping size (or weight) limit is reached, removes objects at the start of the queue
+            (least recently used) from both the queue and the mapping (dict) until the new one fits.
+            Setting an existing key replaces its value and marks it as most recently used.
+            If the cache is full and an admission filter is set, a new key is only stored if the
+            filter prefers it over the least recently used key.
+            ttl overrides the caches default time to live for this entry.
+            A value heavier than max_weight on its own is not cached at all.
             """
         if self.capacity == 0:
             print("Capacity is zero. Increase cache limit")
             return
         
-        if len(self.cache) >= self.capacity:
-            del_node = self.start
-            self.start = self.start.next
-            del self.cache[del_node.key]
+        if key in self.cache:
+            self._remove(self.cache[key])
+        elif (self.admission is not None and len(self.cache) >= self.capacity
+                and not self.admission.admit(key, self.start.key)):
+            return
+        new_node = self._make_node(key, value, ttl)
+        if new_node is None:
+            return
+        
+        while len(self.cache) >= self.capacity or (
+                self.max_weight is not None and self.total_weight + new_node.weight > self.max_weight):
+            self._remove(self.start)
+            self.evictions += 1
+        self._append(new_node)
+        self.cache[key] = new_node
+        self.total_weight += new_node.weight
+
+    def get_many(self, keys):
+        """ Batch version of get: looks up all keys in one pass.
+            Returns a (hits, misses) tuple: hits maps every found key to its value,
+            misses lists the keys that are not in the cache (or expired) in input order.
+            Found keys are moved to the end of the queue in input order, just like repeated get calls.
+            """
+        hits = {}
+        misses = []
+        cache = self.cache
+        now = self.clock() if self.expiry else None
+        admission = self.admission
+        for key in keys:
+            if admission is not None:
+                admission.record(key)
+            curr_node = cache.get(key)
+            if curr_node is None:
+                misses.append(key)
+                continue
+            if curr_node.expires is not None and curr_node.expires <= now:
+                self._remove(curr_node)
+                misses.append(key)
+                continue
+            if curr_node is not self.end:
+                # inlined _unlink / _append, curr_node is never the end of the queue here
+                if curr_node.previous is None:
+                    self.start = curr_node.next
+                else:
+                    curr_node.previous.next = curr_node.next
+                curr_node.next.previous = curr_node.previous
+                curr_node.next = None
+                curr_node.previous = self.end
+                self.end.next = curr_node
+                self.end = curr_node
+            if curr_node.value.__class__ is _SnapshotValue:
+                curr_node.value = curr_node.value.decode()
+            hits[key] = curr_node.value
+        return hits, misses
+
+    def set_many(self, items, ttl=None):
+        """ Batch version of set: items is a mapping or an iterable of (key, value) pairs.
+            All items are inserted at the end of the queue first, then the least recently used
+            items are evicted from the start of the queue in one go until capacity (and max_weight) is met.
+            Without max_weight the resulting cache is the same as after calling set for each item in order.
+            With an admission filter the items are set one by one, so every new key has to pass the filter.
+            """
+        if self.capacity == 0:
+            print("Capacity is zero. Increase cache limit")
+            return
+        
+        if hasattr(items, "items"):
+            items = items.items()
+        if self.admission is not None:
+            plain_set = type(self).set    # not the statistics wrapper, a batch is no single set call
+            for key, value in items:
+                plain_set(self, key, value, ttl)
+            return
+        cache = self.cache
+        plain = self.max_weight is None and ttl is None and self.ttl is None
+        for key, value in items:
+            curr_node = cache.get(key)
+            if curr_node is not None:
+                self._remove(curr_node)
+            if plain:
+                curr_node = CacheNode(value)
+                curr_node.key = key
+            else:
+                curr_node = self._make_node(key, value, ttl)
+                if curr_node is None:
+                    continue
+                self.total_weight += curr_node.weight
+            self._append(curr_node)
+            cache[key] = curr_node
+        
+        while len(cache) > self.capacity or (
+                self.max_weight is not None and self.total_weight > self.max_weight):
+            self._remove(self.start)
+            self.evictions += 1
+
+    def sweep(self, max_items=None):
+        """ Removes expired entries without scanning the queue: only the due entries at the
+            top of the expiry heap are looked at (stale heap entries of replaced or evicted
+            nodes are dropped on the way). Call it periodically, e.g. from a timer.
+            Returns the number of removed entries.
+            """
+        now = self.clock()
+        removed = 0
+        while self.expiry and self.expiry[0][0] <= now:
+            if max_items is not None and removed >= max_items:
+                break
+            expires, _, node = heapq.heappop(self.expiry)
+            if self.cache.get(node.key) is node and node.expires == expires:
+                self._remove(node)
+                removed += 1
+        return removed
+
+    def enable_stats(self, sample_every=64):
+        """ Switches on hit / miss counting and latency sampling of get and set.
+            Instrumented versions of get, set and get_many are installed on this instance only,
+            so a cache without statistics runs the plain methods at no extra cost.
+            """
+        stats = self.stats = CacheStats(sample_every)
+        plain_get = type(self).get.__get__(self)
+        plain_set = type(self).set.__get__(self)
+        plain_get_many = type(self).get_many.__get__(self)
+        countdown = {"get": sample_every, "set": sample_every}
+        
+        def get(key):
+            countdown["get"] -= 1
+            if countdown["get"]:
+                value = plain_get(key)
+            else:
+                countdown["get"] = stats.sample_every
+                t0 = time.perf_counter_ns()
+                value = plain_get(key)
+                stats.get_latency.record(time.perf_counter_ns() - t0)
+            if value == -1:
+                stats.misses += 1
+            else:
+                stats.hits += 1
+            return value
+        
+        def set(key, value, ttl=None):
+            countdown["set"] -= 1
+            if countdown["set"]:
+                return plain_set(key, value, ttl)
+            countdown["set"] = stats.sample_every
+            t0 = time.perf_counter_ns()
+            plain_set(key, value, ttl)
+            stats.set_latency.record(time.perf_counter_ns() - t0)
+        
+        def get_many(keys):
+            hits, misses = plain_get_many(keys)
+            stats.hits += len(hits)
+            stats.misses += len(misses)
+            return hits, misses
+        
+        self.get = get
+        self.set = set
+        self.get_many = get_many
+
+    def disable_stats(self):
+        """ Removes the instrumented methods again, back to zero overhead """
+        for name in ("get", "set", "get_many"):
+            self.__dict__.pop(name, None)
+        self.stats = None
+
+    def stats_snapshot(self):
+        """ Returns a dict with the current counters and latency percentiles (microseconds),
+            ready to be exported by a metrics scraper (JSON safe: capacity is None for no limit).
+            Latencies are None without statistics.
+            """
+        stats = self.stats
+        snapshot = {
+            "size": len(self.cache),
+            "capacity": None if self.capacity == float("inf") else self.capacity,
+            "evictions": self.evictions,
+            "hits": stats.hits if stats else None,
+            "misses": stats.misses if stats else None,
+        }
+        lookups = (stats.hits + stats.misses) if stats else 0
+        snapshot["hit_ratio"] = stats.hits / lookups if lookups else None
+        for name in ("get", "set"):
+            histogram = getattr(stats, name + "_latency") if stats else None
+            for p in (50, 99):
+                value = histogram.percentile(p) if histogram else None
+                snapshot["{}_p{}_us".format(name, p)] = value / 1000 if value is not None else None
+        return snapshot
+
+    def save(self, path):
+        """ Writes all entries with their recency order (start -> end) to a snapshot file,
+            that LRU_Cache.load can map back into memory. Values that were loaded from a snapshot
+            and never looked up are copied over without decoding them.
+            The file is written next to path first and then renamed, so a crash never leaves
+            a half written snapshot behind. Expiry times are not saved.
+            """
+        keys = []
+        offsets = array("Q")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(b"\0" * _Snapshot.HEADER.size)
+            position = _Snapshot.HEADER.size
+            node = self.start
+            while node is not None:
+                value = node.value
+                if value.__class__ is _SnapshotValue:
+                    raw = value.snapshot.raw(value.index)
+                else:
+                    raw = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                offsets.append(position)
+                file.write(raw)
+                position += len(raw)
+                keys.append(node.key)
+                node = node.next
+            offsets.append(position)
+            
+            raw_keys = pickle.dumps(keys, pickle.HIGHEST_PROTOCOL)
+            file.write(raw_keys)
+            if sys.byteorder == "big":
+                offsets.byteswap()
+            file.write(offsets.tobytes())
+            file.seek(0)
+            capacity = _Snapshot.UNLIMITED if self.capacity == float("inf") else self.capacity
+            file.write(_Snapshot.HEADER.pack(_Snapshot.MAGIC, len(keys), position, len(raw_keys),
+                                             position + len(raw_keys), capacity))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, capacity=None, **kwargs):
+        """ Creates a cache from a snapshot file written by save. The file is memory mapped and only
+            the keys are decoded up front; every value is decoded on its first lookup.
+            capacity defaults to the capacity of the saved cache; if a smaller one is passed, only the
+            most recently used entries are loaded. Further keyword arguments are passed to LRU_Cache.
+            With max_weight the values have to be weighed, so they are decoded right away.
+            """
+        snapshot = _Snapshot(path)
+        if capacity is None:
+            capacity = snapshot.capacity
+        cache = cls(capacity, **kwargs)
+        if cache.capacity == 0:
+            return cache
+        
+        keys = snapshot.keys()
+        first = max(0, snapshot.count - cache.capacity)
+        if cache.max_weight is None and cache.ttl is None:
+            # fast path: build and link all nodes with as little Python code per entry as possible.
+            # Millions of new container objects would trigger the cyclic garbage collector over and
+            # over (it dominated the load time), none of them is garbage yet, so it is paused meanwhile
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                keys = keys[first:]
+                nodes = [CacheNode(_SnapshotValue(snapshot, index)) for index in range(first, snapshot.count)]
+                for node, key in zip(nodes, keys):
+                    node.key = key
+                for prev_node, node in zip(nodes, nodes[1:]):
+                    prev_node.next = node
+                    node.previous = prev_node
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            if nodes:
+                cache.start = nodes[0]; cache.end = nodes[-1]
+            cache.cache = dict(zip(keys, nodes))
+            return cache
+        
+        for index in range(first, snapshot.count):
+            value = _SnapshotValue(snapshot, index)
+            if cache.max_weight is not None:
+                value = value.decode()
+            node = cache._make_node(keys[index], value, None)
+            if node is None:
+                continue
+            cache.total_weight += node.weight
+            cache._append(node)
+            cache.cache[node.key] = node
+        while cache.max_weight is not None and cache.total_weight > cache.max_weight:
+            cache._remove(cache.start)
+        return cache
+
+    def clear(self):
+        """ Removes all entries """
+        self.cache = {}
+        self.start = None; self.end = None
+        self.total_weight = 0
+        self.expiry = []
+
+    def _make_node(self, key, value, ttl):
+        """ Creates the CacheNode for key / value, returns None if value is too heavy to be cached """
         new_node = CacheNode(value)
         new_node.key = key
-        if self.start is None:
-            self.start = new_node
-            self.end = self.start
+        if self.max_weight is not None:
+            new_node.weight = self.sizer(value)
+            if new_node.weight > self.max_weight:
+                return None
+        if ttl is None:
+            ttl = self.ttl
+        if ttl is not None:
+            # replaced and evicted nodes leave stale heap entries behind, drop them once they dominate
+            if len(self.expiry) > 2 * len(self.cache) + 64:
+                self.expiry = [item for item in self.expiry
+                               if self.cache.get(item[2].key) is item[2] and item[2].expires == item[0]]
+                heapq.heapify(self.expiry)
+            new_node.expires = self.clock() + ttl
+            self._expiry_counter += 1
+            heapq.heappush(self.expiry, (new_node.expires, self._expiry_counter, new_node))
+        return new_node
+
+    def _remove(self, node):
+        """ Removes node from both the queue and the mapping """
+        self._unlink(node)
+        del self.cache[node.key]
+        self.total_weight -= node.weight
+
+    def _unlink(self, node):
+        """ Removes node from the queue, reconnecting its neighbours (and start / end) """
+        if node.previous is None:
+            self.start = node.next
         else:
-            self.end.next = new_node
-            self.end.next.previous = self.end
-            self.end = self.end.next
-        self.cache[key] = new_node
+            node.previous.next = node.next
+        if node.next is None:
+            self.end = node.previous
+        else:
+            node.next.previous = node.previous
+        node.next = None
+        node.previous = None
+
+    def _append(self, node):
+        """ Appends node to the end of the queue (most recently used position) """
+        if self.end is None:
+            self.start = node
+        else:
+            self.end.next = node
+            node.previous = self.end
+        self.end = node
+
+
+class TinyLFU(object):
+    """ Frequency based admission filter (TinyLFU) for scan resistant caches.
+        Access frequencies are estimated in a Count-Min Sketch: every key increments one small
+        counter in each row, its estimate is the minimum of these counters. Once sample_size
+        accesses were recorded all counters are halved, so old popularity fades out.
+        A new key is only admitted to a full cache if it was accessed more often than the
+        key that would be evicted for it - keys touched once by a scan never push out the working set.
+        PARAMETERS:
+        ==========
+        self.rows = list of counter arrays (one per hash function), counters saturate at 15
+        self.mask / self.shift = helpers to map hash values to counter indices
+        self.sample_size = number of recorded accesses after which counters are halved
+        self.recorded = accesses recorded since the last halving
+        """
+    
+    SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+    
+    def __init__(self, capacity, sample_factor=10):
+        width = 16
+        while width < capacity:
+            width *= 2
+        self.rows = [array("B", [0]) * width for _ in self.SEEDS]
+        self.mask = 0xFFFFFFFFFFFFFFFF
+        self.shift = 64 - width.bit_length() + 1
+        self.sample_size = max(1, sample_factor * capacity)
+        self.recorded = 0
+    
+    def _indices(self, key):
+        """ Counter index of key in each row (one multiplicative hash per row) """
+        h = hash(key)
+        mask = self.mask
+        shift = self.shift
+        s0, s1, s2, s3 = self.SEEDS
+        return ((h * s0 & mask) >> shift, (h * s1 & mask) >> shift,
+                (h * s2 & mask) >> shift, (h * s3 & mask) >> shift)
+    
+    def record(self, key):
+        """ Count one access of key """
+        i0, i1, i2, i3 = self._indices(key)
+        r0, r1, r2, r3 = self.rows
+        if r0[i0] < 15: r0[i0] += 1
+        if r1[i1] < 15: r1[i1] += 1
+        if r2[i2] < 15: r2[i2] += 1
+        if r3[i3] < 15: r3[i3] += 1
+        self.recorded += 1
+        if self.recorded >= self.sample_size:
+            self.recorded = 0
+            self.rows = [array("B", (count >> 1 for count in row)) for row in self.rows]
+    
+    def estimate(self, key):
+        """ Estimated number of (recent) accesses of key """
+        i0, i1, i2, i3 = self._indices(key)
+        r0, r1, r2, r3 = self.rows
+        return min(r0[i0], r1[i1], r2[i2], r3[i3])
+    
+    def admit(self, candidate, victim):
+        """ True if candidate should replace victim in the cache """
+        return self.estimate(candidate) > self.estimate(victim)
+
+
+class SegmentedLRU_Cache(object):
+    """ Segmented LRU Cache (SLRU, a simplified 2Q), resistant to one time scans.
+        New keys enter a probation segment. Only a key that is looked up again while in probation
+        is promoted to the protected segment, which holds at most protected_ratio of the capacity.
+        When the protected segment is full its least recently used key is demoted back to the end of
+        probation, and evictions always come from the start of probation - so a scan that touches
+        every key once only ever replaces other probation entries.
+        PARAMETERS:
+        ==========
+        self.capacity = size limit (int) of both segments together
+        self.probation / self.protected = LRU_Cache segments, nodes are moved between their queues
+        self.admission = optional admission filter (e.g. TinyLFU) consulted before evicting
+        """
+    
+    def __init__(self, capacity, protected_ratio=0.8, admission=None):
+        self.capacity = capacity
+        # probation may temporarily use the whole capacity while protected is still filling up
+        self.probation = LRU_Cache(capacity)
+        self.protected = LRU_Cache(min(int(capacity * protected_ratio), max(capacity - 1, 0)))
+        self.admission = admission
+    
+    def __len__(self):
+        return len(self.probation.cache) + len(self.protected.cache)
+    
+    def get(self, key):
+        """ Returns the value mapped to key (-1 if key does not exist), promoting probation keys """
+        if self.admission is not None:
+            self.admission.record(key)
+        
+        if key in self.protected.cache:
+            return self.protected.get(key)
+        curr_node = self.probation.cache.get(key)
+        if curr_node is None:
+            return -1
+        
+        self.probation._remove(curr_node)
+        if self.protected.capacity == 0:
+            self.probation._append(curr_node)
+            self.probation.cache[key] = curr_node
+            return curr_node.value
+        if len(self.protected.cache) >= self.protected.capacity:
+            demoted = self.protected.start
+            self.protected._remove(demoted)
+            self.probation._append(demoted)
+            self.probation.cache[demoted.key] = demoted
+        self.protected._append(curr_node)
+        self.protected.cache[key] = curr_node
+        return curr_node.value
+    
+    def set(self, key, value):
+        """ Updates key in its segment, or inserts a new key at the end of probation,
+            evicting the least recently used probation key if the cache is full.
+            """
+        if self.capacity == 0:
+            print("Capacity is zero. Increase cache limit")
+            return
+        
+        if key in self.protected.cache:
+            self.protected.set(key, value)
+            return
+        if key not in self.probation.cache and len(self) >= self.capacity:
+            segment = self.probation if self.probation.start is not None else self.protected
+            victim = segment.start
+            if self.admission is not None and not self.admission.admit(key, victim.key):
+                return
+            segment._remove(victim)
+        self.probation.set(key, value)
+
+
+POLICIES = {
+    "lru": lambda capacity: LRU_Cache(capacity),
+    "lru+tinylfu": lambda capacity: LRU_Cache(capacity, admission=TinyLFU(capacity)),
+    "slru": lambda capacity: SegmentedLRU_Cache(capacity),
+    "slru+tinylfu": lambda capacity: SegmentedLRU_Cache(capacity, admission=TinyLFU(capacity)),
+}
+
+
+def make_cache(capacity, policy="lru"):
+    """ Creates a cache with the given eviction / admission policy (one of POLICIES) """
+    if policy not in POLICIES:
+        raise ValueError("Unknown policy {!r}, choose one of {}".format(policy, sorted(POLICIES)))
+    return POLICIES[policy](capacity)
+
+
+class ShardedLRU_Cache(object):
+    """ Thread-safe LRU Cache, split into independent LRU_Cache shards.
+        Each key is hashed to exactly one shard and every shard holds its own lock,
+        so threads working on different shards never wait for each other.
+        Recency is tracked per shard: the evicted item is the least recently used one
+        of its shard, not necessarily of the whole cache.
+        PARAMETERS:
+        ==========
+        self.capacity = overall size limit (int), split as evenly as possible across the shards
+                        (shard capacities always add up to exactly self.capacity)
+        self.shards = list of LRU_Cache objects
+        self.locks = one threading.Lock per shard
+        """
+    
+    def __init__(self, capacity, num_shards=16):
+        self.capacity = capacity
+        # never create empty shards: a zero capacity shard would reject all its keys
+        num_shards = max(1, min(num_shards, capacity))
+        per_shard, remainder = divmod(capacity, num_shards)
+        self.shards = [LRU_Cache(per_shard + (1 if idx < remainder else 0))
+                       for idx in range(num_shards)]
+        self.locks = [threading.Lock() for _ in range(num_shards)]
+    
+    def _shard_index(self, key):
+        """ Map a key to the index of its shard """
+        return hash(key) % len(self.shards)
+    
+    def get(self, key):
+        """ Same as LRU_Cache.get, only holding the lock of the key's shard """
+        idx = self._shard_index(key)
+        with self.locks[idx]:
+            return self.shards[idx].get(key)
+    
+    def set(self, key, value):
+        """ Same as LRU_Cache.set, only holding the lock of the key's shard """
+        idx = self._shard_index(key)
+        with self.locks[idx]:
+            self.shards[idx].set(key, value)
+    
+    def __len__(self):
+        return sum(len(shard.cache) for shard in self.shards)
 
 
+class CompactLRU_Cache(object):
+    """ Memory compact LRU Cache, same behaviour as LRU_Cache but without one CacheNode
+        (and one dict entry) per item. Everything lives in preallocated flat storage indexed by slot:
+        the queue is kept in two integer arrays holding the slot indices of the neighbours,
+        keys and values are stored in plain lists and the lookup is an open addressing
+        hash table (linear probing) of slot indices.
+        Slots of evicted entries are reused for new entries.
+        PARAMETERS:
+        ==========
+        self.capacity = size limit (int)
+        self.size = number of slots in use
+        self.table = hash table of slot indices (-1 = empty bucket), at most half full
+        self.mask / self.shift = helpers to map hash values to table indices
+        self.keys / self.values = key and value stored in each slot
+        self.next / self.previous = slot index of the neighbours in the queue (-1 = no neighbour)
+        self.start / self.end = slot index of the least / most recently used item (-1 = empty queue)
+        """
+    
+    __slots__ = ("capacity", "size", "table", "mask", "shift", "keys", "values",
+                 "next", "previous", "start", "end")
+    
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        table_size = 1
+        while table_size < 2 * capacity:
+            table_size *= 2
+        self.table = array("i", [-1]) * table_size
+        self.mask = table_size - 1
+        self.shift = 64 - table_size.bit_length() + 1
+        self.keys = [None] * capacity
+        self.values = [None] * capacity
+        self.next = array("i", [-1]) * capacity
+        self.previous = array("i", [-1]) * capacity
+        self.start = -1; self.end = -1
+    
+    def __len__(self):
+        return self.size
+    
+    def get(self, key):
+        """ Returns the value mapped to key and moves its slot to the end of the queue.
+            If key does not exist, returns -1.
+            """
+        slot = self.table[self._bucket(key)]
+        if slot == -1:
+            return -1
+        if slot != self.end:
+            self._unlink(slot)
+            self._append(slot)
+        return self.values[slot]
+    
+    def set(self, key, value):
+        """ Stores value in a free slot at the end of the queue. If there is no free slot,
+            the slot at the start of the queue (least recently used) is emptied and reused.
+            """
+        if self.capacity == 0:
+            print("Capacity is zero. Increase cache limit")
+            return
+        
+        bucket = self._bucket(key)
+        slot = self.table[bucket]
+        if slot != -1:
+            self._unlink(slot)
+        else:
+            if self.size < self.capacity:
+                slot = self.size
+                self.size += 1
+            else:
+                slot = self.start
+                self._unlink(slot)
+                self._remove_bucket(self._bucket(self.keys[slot]))
+                bucket = self._bucket(key)   # removal may have shifted buckets
+            self.table[bucket] = slot
+            self.keys[slot] = key
+        self.values[slot] = value
+        self._append(slot)
+    
+    def _bucket(self, key):
+        """ Returns the hash table index holding key, or the empty bucket where key belongs """
+        table = self.table
+        keys = self.keys
+        bucket = self._home(key)
+        slot = table[bucket]
+        while slot != -1 and keys[slot] != key:
+            bucket = (bucket + 1) & self.mask
+            slot = table[bucket]
+        return bucket
+    
+    def _home(self, key):
+        """ First hash table index to probe for key. Fibonacci hashing spreads runs of
+            consecutive integer keys (whose hash is the integer itself) over the whole table """
+        return (hash(key) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF) >> self.shift
+    
+    def _remove_bucket(self, bucket):
+        """ Empties a hash table bucket, shifting later entries of the same probe run backwards
+            so that no lookup stops too early (no tombstones needed) """
+        table = self.table
+        mask = self.mask
+        idx = bucket
+        while True:
+            idx = (idx + 1) & mask
+            slot = table[idx]
+            if slot == -1:
+                break
+            home = self._home(self.keys[slot])
+            # move the entry if the emptied bucket lies on its probe path
+            if (idx - home) & mask >= (idx - bucket) & mask:
+                table[bucket] = slot
+                bucket = idx
+        table[bucket] = -1
+    
+    def _unlink(self, slot):
+        """ Removes slot from the queue, reconnecting its neighbours (and start / end) """
+        prev_slot = self.previous[slot]
+        next_slot = self.next[slot]
+        if prev_slot == -1:
+            self.start = next_slot
+        else:
+            self.next[prev_slot] = next_slot
+        if next_slot == -1:
+            self.end = prev_slot
+        else:
+            self.previous[next_slot] = prev_slot
+        self.next[slot] = -1
+        self.previous[slot] = -1
+    
+    def _append(self, slot):
+        """ Appends slot to the end of the queue (most recently used position) """
+        if self.end == -1:
+            self.start = slot
+        else:
+            self.next[self.end] = slot
+            self.previous[slot] = self.end
+        self.end = slot
+
+
+_KWARGS_MARK = object()
+
+
+def _make_key(args, kwargs):
+    """ Hashable cache key for a function call (all arguments must be hashable) """
+    if kwargs:
+        return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+    return args
+
+
+def memoize(capacity=128, cache=None):
+    """ Decorator caching the results of a function in an LRU_Cache, keyed by its arguments.
+        Works for plain functions and for async def coroutine functions. For coroutines, concurrent
+        calls with the same arguments that miss the cache share one in-flight computation
+        (single-flight) instead of computing the same value many times at once.
+        Pass cache to use a preconfigured LRU_Cache (e.g. with ttl or max_weight) instead of capacity.
+        The decorated function gets:
+            .cache = the backing LRU_Cache
+            .cache_info() = dict with hits, misses, coalesced (waited for an in-flight call),
+                            evictions and current size
+            .cache_clear() = empty the cache and reset the counters
+        """
+    if cache is None:
+        cache = LRU_Cache(capacity)
+    
+    def decorator(func):
+        counters = {"hits": 0, "misses": 0, "coalesced": 0}
+        in_flight = {}
+        
+        def finish(key, task):
+            """ Done callback of an in-flight task: cache its result (runs before the waiters resume) """
+            if in_flight.get(key) is task:
+                del in_flight[key]
+            if not task.cancelled() and task.exception() is None:   # exception() marks it as retrieved
+                cache.set(key, (task.result(),))
+        
+        # values are stored wrapped in a 1-tuple, so a cached result of -1 is not mistaken for a miss
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                key = _make_key(args, kwargs)
+                cached = cache.get(key)
+                if cached != -1:
+                    counters["hits"] += 1
+                    return cached[0]
+                task = in_flight.get(key)
+                if task is not None:
+                    counters["coalesced"] += 1
+                else:
+                    counters["misses"] += 1
+                    # the computation runs as its own task: cancelling the caller that started it
+                    # must not cancel it for the other callers waiting on it
+                    task = asyncio.ensure_future(func(*args, **kwargs))
+                    in_flight[key] = task
+                    task.add_done_callback(functools.partial(finish, key))
+                # shield: a cancelled caller only cancels its own wait
+                return await asyncio.shield(task)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = _make_key(args, kwargs)
+                cached = cache.get(key)
+                if cached != -1:
+                    counters["hits"] += 1
+                    return cached[0]
+                counters["misses"] += 1
+                result = func(*args, **kwargs)
+                cache.set(key, (result,))
+                return result
+        
+        def cache_info():
+            info = dict(counters)
+            info["evictions"] = cache.evictions
+            info["size"] = len(cache.cache)
+            return info
+        
+        def cache_clear():
+            cache.clear()
+            cache.evictions = 0
+            for name in counters:
+                counters[name] = 0
+        
+        wrapper.cache = cache
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    
+    return decorator
+
+
+def benchmark_sharded_cache(num_ops=200000, capacity=10000, key_range=20000):
+    """ Contention benchmark: runs a 80/20 get/set workload with 1, 4 and 16 threads
+        against a single-lock cache (one shard) and a 16-way sharded cache.
+        Prints the throughput (operations per second) of each run.
+        """
+    
+    def worker(cache, keys):
+        for idx, key in enumerate(keys):
+            if idx % 5 == 0:
+                cache.set(key, key)
+            else:
+                cache.get(key)
+    
+    rng = random.Random(42)
+    keys = [rng.randrange(key_range) for _ in range(num_ops)]
+    
+    for name, num_shards in (("single lock", 1), ("16 shards", 16)):
+        for num_threads in (1, 4, 16):
+            cache = ShardedLRU_Cache(capacity, num_shards)
+            chunk = num_ops // num_threads
+            threads = [threading.Thread(target=worker, args=(cache, keys[i*chunk:(i+1)*chunk]))
+                       for i in range(num_threads)]
+            t0 = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - t0
+            print("{:<12} {:>2} threads: {:>10.0f} ops/s".format(name, num_threads, chunk*num_threads/elapsed))
+
+
+def benchmark_cache_memory(num_entries=10**6):
+    """ Fills LRU_Cache and CompactLRU_Cache with num_entries items and prints the
+        memory used per entry (measured with tracemalloc). Keys and values are created
+        up front, so only the storage overhead of the caches is counted.
+        """
+    keys = list(range(num_entries))
+    values = [str(key) for key in keys]
+    
+    for cache_class in (LRU_Cache, CompactLRU_Cache):
+        tracemalloc.start()
+        cache = cache_class(num_entries)
+        for key, value in zip(keys, values):
+            cache.set(key, value)
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("{:<16} {:>6.1f} bytes per entry".format(cache_class.__name__, used/num_entries))
+        del cache
+
+
+def benchmark_batch_api(batch_size=200, rounds=2000, capacity=10000):
+    """ Compares get_many / set_many against a loop of single get / set calls
+        on batches of batch_size random keys (about half of them cached).
+        """
+    rng = random.Random(42)
+    batches = [[rng.randrange(2 * capacity) for _ in range(batch_size)] for _ in range(rounds)]
+    
+    def single_calls(cache):
+        for keys in batches:
+            for key in keys:
+                if cache.get(key) == -1:
+                    cache.set(key, key)
+    
+    def batch_calls(cache):
+        for keys in batches:
+            hits, misses = cache.get_many(keys)
+            cache.set_many((key, key) for key in misses)
+    
+    for name, run in (("single calls", single_calls), ("get/set_many", batch_calls)):
+        cache = LRU_Cache(capacity)
+        t0 = time.perf_counter()
+        run(cache)
+        elapsed = time.perf_counter() - t0
+        print("{:<13} {:>10.0f} keys/s".format(name, batch_size*rounds/elapsed))
+
+
+def benchmark_policies(num_ops=300000, capacity=1000, num_keys=100000):
+    """ Trace replay benchmark for all POLICIES: every access is a get, followed by a set on a miss.
+        Workloads: "zipf" = Zipf distributed keys (s=1), "zipf+scan" = the same trace interleaved
+        with long sequential scans over keys that are never used again.
+        Prints hit ratio and operations per second for each policy and workload.
+        """
+    rng = random.Random(42)
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, num_keys + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    zipf = rng.choices(range(num_keys), cum_weights=cum_weights, k=num_ops)
+    
+    scan = []
+    next_scan_key = num_keys
+    for idx in range(0, num_ops, 10000):
+        scan.extend(zipf[idx:idx+5000])
+        scan.extend(range(next_scan_key, next_scan_key + 5000))   # one time scan, 5x the capacity
+        next_scan_key += 5000
+    
+    for workload, trace in (("zipf", zipf), ("zipf+scan", scan)):
+        for policy in POLICIES:
+            cache = make_cache(capacity, policy)
+            hits = 0
+            t0 = time.perf_counter()
+            for key in trace:
+                if cache.get(key) == -1:
+                    cache.set(key, key)
+                else:
+                    hits += 1
+            elapsed = time.perf_counter() - t0
+            print("{:<10} {:<13} hit ratio {:>6.2%} {:>10.0f} ops/s".format(
+                workload, policy, hits/len(trace), len(trace)/elapsed))
+
+
+def benchmark_stats_overhead(num_ops=500000, capacity=1000):
+    """ Measures get / set throughput of a plain LRU_Cache and of one with statistics switched on,
+        then prints the stats snapshot of the instrumented cache.
+        """
+    rng = random.Random(42)
+    keys = [rng.randrange(2 * capacity) for _ in range(num_ops)]
+    
+    for stats in (False, True):
+        cache = LRU_Cache(capacity, stats=stats)
+        t0 = time.perf_counter()
+        for key in keys:
+            if cache.get(key) == -1:
+                cache.set(key, key)
+        elapsed = time.perf_counter() - t0
+        print("stats={!s:<5} {:>10.0f} ops/s".format(stats, num_ops/elapsed))
+    print(cache.stats_snapshot())
+
+
+def benchmark_snapshot(num_entries=10**6, path="lru_snapshot.bin"):
+    """ Cold start (refilling an empty cache from the "backend", here: building the values again)
+        against warm start (LRU_Cache.load of a snapshot), plus the time until every entry was hit once.
+        """
+    def backend(key):
+        return {"id": key, "name": "user{}".format(key)}
+    
+    t0 = time.perf_counter()
+    cache = LRU_Cache(num_entries)
+    cache.set_many((key, backend(key)) for key in range(num_entries))
+    cold = time.perf_counter() - t0
+    
+    t0 = time.perf_counter()
+    cache.save(path)
+    saved = time.perf_counter() - t0
+    del cache
+    
+    t0 = time.perf_counter()
+    cache = LRU_Cache.load(path)
+    warm = time.perf_counter() - t0
+    first_hit = cache.get(0)
+    t0 = time.perf_counter()
+    for key in range(num_entries):
+        cache.get(key)
+    decode_all = time.perf_counter() - t0
+    
+    print("snapshot size      {:>8.1f} MB".format(os.path.getsize(path) / 2**20))
+    print("cold start (fill)  {:>8.2f} s".format(cold))
+    print("save               {:>8.2f} s".format(saved))
+    print("warm start (load)  {:>8.2f} s, first hit: {}".format(warm, first_hit))
+    print("hit every entry    {:>8.2f} s (decodes all values)".format(decode_all))
+    del cache, first_hit
+    os.remove(path)
+
 
 ### Official test cases
 
@@ -122,10 +1158,10 @@ mycache = LRU_Cache(3)
 mycache.set(1,1)
 print(mycache.get(1), "---> should return 1")
 # 1
-# cache should be empty now:
+# the only node is both start and end of the queue:
 node = mycache.start
-print(node, "---> should return None")
-# None
+print(node.key, node is mycache.end, "---> should return 1 True")
+# 1 True
 
 # edge case1
 mycache = LRU_Cache(0)
@@ -137,3 +1173,180 @@ mycache = LRU_Cache(1)
 mycache.set(1,1)
 mycache.set(2,2)
 print(mycache.get(1)) # returns -1, cause already deleted
+
+print("=========================")
+
+### Sharded cache ###
+
+sharded = ShardedLRU_Cache(5, num_shards=2)
+print([shard.capacity for shard in sharded.shards], "---> should return [3, 2]")
+# [3, 2]
+for i in range(10):
+    sharded.set(i, i)
+print(len(sharded), "---> should return 5")
+# 5 (overall capacity still holds)
+print(sharded.get(9), "---> should return 9")
+# 9
+print(len(ShardedLRU_Cache(2, num_shards=16).shards), "---> should return 2")
+# 2 (no empty shards)
+
+
+print("=========================")
+
+### Compact cache ###
+
+compact = CompactLRU_Cache(2)
+compact.set(1, 1)
+compact.set(2, 2)
+print(compact.get(1), "---> should return 1")
+# 1
+compact.set(3, 3)   # 2 is the least recently used entry, its slot gets reused
+print(compact.get(2), compact.get(3), "---> should return -1 3")
+# -1 3
+print(len(compact), "---> should return 2")
+# 2
+
+print("=========================")
+
+### Batch API ###
+
+batch_cache = LRU_Cache(3)
+batch_cache.set_many({1: 1, 2: 2, 3: 3, 4: 4})   # 1 is evicted at the end of the batch
+print(batch_cache.get_many([1, 2, 4]), "---> should return ({2: 2, 4: 4}, [1])")
+# ({2: 2, 4: 4}, [1])
+batch_cache.set_many([(5, 5), (2, 20)])          # 3 is the least recently used entry now
+print(batch_cache.get_many([2, 3]), "---> should return ({2: 20}, [3])")
+# ({2: 20}, [3])
+
+print("=========================")
+
+### TTL and weight limit ###
+
+now = [0]   # fake clock, so the test does not need to sleep
+ttl_cache = LRU_Cache(10, ttl=5, clock=lambda: now[0])
+ttl_cache.set(1, 1)
+ttl_cache.set(2, 2, ttl=60)
+now[0] = 10
+print(ttl_cache.get(1), ttl_cache.get(2), "---> should return -1 2")
+# -1 2 (1 expired lazily on get)
+ttl_cache.set(3, 3)
+now[0] = 100
+print(ttl_cache.sweep(), len(ttl_cache.cache), "---> should return 2 0")
+# 2 0
+
+weighted = LRU_Cache(None, max_weight=10, sizer=len)
+weighted.set("a", "xxxx")
+weighted.set("b", "xxxx")
+weighted.set("c", "xxxx")   # 12 > 10, so "a" is evicted
+print(weighted.get("a"), weighted.total_weight, "---> should return -1 8")
+# -1 8
+weighted.set("d", "x" * 11)  # too heavy to be cached at all
+print(weighted.get("d"), len(weighted.cache), "---> should return -1 2")
+# -1 2
+
+print("=========================")
+
+### Eviction policies ###
+
+slru = make_cache(4, "slru")   # 3 protected, at least 1 probation slot
+slru.set(1, 1)
+slru.set(2, 2)
+slru.get(1); slru.get(2)       # looked up again -> protected
+for key in range(100, 110):    # one time scan
+    slru.set(key, key)
+print(slru.get(1), slru.get(2), "---> should return 1 2")
+# 1 2 (the scan only replaced probation entries)
+
+lfu = make_cache(2, "lru+tinylfu")
+for _ in range(3):
+    lfu.get(1); lfu.set(1, 1)
+    lfu.get(2); lfu.set(2, 2)
+lfu.get(3); lfu.set(3, 3)      # seen once, not admitted over the frequent keys
+print(lfu.get(3), lfu.get(1), lfu.get(2), "---> should return -1 1 2")
+# -1 1 2
+lfu.set_many([(4, 4), (5, 5)])  # batch writes pass the filter as well
+print(lfu.get(1), lfu.get(2), "---> should return 1 2")
+# 1 2
+
+print("=========================")
+
+### Memoization ###
+
+@memoize(capacity=100)
+def fib(n):
+    return n if n < 2 else fib(n-1) + fib(n-2)
+
+print(fib(80), fib.cache_info(), "---> should return 23416728348467685 {'hits': 78, 'misses': 81, 'coalesced': 0, 'evictions': 0, 'size': 81}")
+# 23416728348467685 {'hits': 78, 'misses': 81, 'coalesced': 0, 'evictions': 0, 'size': 81}
+
+@memoize(capacity=10)
+async def slow_square(x):
+    await asyncio.sleep(0.01)
+    return x * x
+
+async def many_calls():
+    return await asyncio.gather(*(slow_square(3) for _ in range(5)))
+
+print(asyncio.run(many_calls()), slow_square.cache_info()["misses"], "---> should return [9, 9, 9, 9, 9] 1")
+# [9, 9, 9, 9, 9] 1 (computed once, the other 4 calls waited for it)
+
+async def cancel_first_caller():
+    owner = asyncio.ensure_future(slow_square(4))
+    await asyncio.sleep(0)                      # owner starts the computation
+    waiter = asyncio.ensure_future(slow_square(4))
+    await asyncio.sleep(0)                      # waiter joins it
+    owner.cancel()
+    return await waiter, owner.cancelled()
+
+print(asyncio.run(cancel_first_caller()), "---> should return (16, True)")
+# (16, True) (only the cancelled caller sees the cancellation)
+
+print("=========================")
+
+### Statistics ###
+
+stats_cache = LRU_Cache(2, stats=True)
+stats_cache.set(1, 1)
+stats_cache.set(2, 2)
+stats_cache.set(3, 3)
+stats_cache.get(1); stats_cache.get(3)
+snapshot = stats_cache.stats_snapshot()
+print(snapshot["hits"], snapshot["misses"], snapshot["evictions"], snapshot["size"], "---> should return 1 1 1 2")
+# 1 1 1 2
+stats_cache.disable_stats()
+print("get" in stats_cache.__dict__, stats_cache.stats_snapshot()["hits"], "---> should return False None")
+# False None
+
+print("=========================")
+
+### Snapshot ###
+
+snap_cache = LRU_Cache(3)
+snap_cache.set("a", [1, 2])
+snap_cache.set("b", "bee")
+snap_cache.set("c", None)
+snap_cache.get("a")                          # queue: b, c, a
+snap_cache.save("lru_test_snapshot.bin")
+restored = LRU_Cache.load("lru_test_snapshot.bin", capacity=2)
+print(list(restored.cache), restored.get("a"), restored.get("b"), "---> should return ['c', 'a'] [1, 2] -1")
+# ['c', 'a'] [1, 2] -1 (only the 2 most recently used entries fit)
+restored = LRU_Cache.load("lru_test_snapshot.bin")
+restored.set("d", 4)
+print(restored.capacity, list(restored.cache), "---> should return 3 ['c', 'a', 'd']")
+# 3 ['c', 'a', 'd'] (capacity of the saved cache, not the number of saved entries)
+LRU_Cache(5).save("lru_test_snapshot.bin")
+restored = LRU_Cache.load("lru_test_snapshot.bin")
+restored.set("a", 1)
+print(restored.capacity, restored.get("a"), "---> should return 5 1")
+# 5 1
+del restored
+os.remove("lru_test_snapshot.bin")
+
+### Benchmarks ### (uncomment to run, takes a few seconds)
+
+# benchmark_sharded_cache()
+# benchmark_cache_memory()
+# benchmark_batch_api()
+# benchmark_policies()
+# benchmark_stats_overhead()
+# benchmark_snapshot()
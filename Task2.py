@@ -1,32 +1,432 @@
+import asyncio
+import collections
+import concurrent.futures
+import fnmatch
+import itertools
 import os
+import pickle
+import queue
+import random
+import re
+import tempfile
+import time
 
 
 def find_files(suffix, path):
     """ Main function, storing all files in a given root (path) ending with suffix (".c") """
-    output = []
-    return _recfiles(suffix, path, output)
+    return list(iter_files(suffix, path))
 
-def _recfiles(suffix, path, output):
-    """ Recursive function, iterates through the given path and checks all its subdirectories.
-        Base case: If an input path to this function is a file, check if it ends with suffix and 
-        eventuallly append it to the output list
-        Else: Create a next_path list with all subdirectories of the current path. Then recursively
-        iterate through each subpath until hitting the base condition.
+def iter_files(suffix, path):
+    """ Generator version of find_files, yielding each matching filename as soon as it is found.
+        Stop iterating (e.g. itertools.islice for the first n matches) to end the walk early.
+        If path itself is a file, check if it ends with suffix and eventually yield it.
+        Memory only holds the listings of the directories on the current path, never all matches.
     """
     
     if os.path.isfile(path):
         if path.endswith(suffix):
-            end_idx = path.rfind("/")
-            filename = path[end_idx+1:]
-            output.append(filename)
-
-    else:
-        next_path = [os.path.join(path, element) for element in os.listdir(path)]
-        for subpath in next_path:
-            _recfiles(suffix, subpath, output)
-            
+            yield os.path.basename(path)
+        return
+    
+    for entry in _walk(path):
+        if entry.path.endswith(suffix):
+            yield entry.name
+
+def find_files_multi(patterns, path, exclude=()):
+    """ Matches several patterns in a single walk and returns full paths (relative to path),
+        as a mapping pattern -> list of matching files in walk order.
+        patterns = suffixes (".c") or glob patterns ("test_*.py", "*.[ch]"), matched against the file name.
+        exclude = glob patterns for names of files to skip and directories to prune - an excluded
+                  directory is never listed, so nothing below it costs any time.
+        All suffixes are checked with one str.endswith call and all globs with one combined regular
+        expression; only names passing this filter are assigned to their individual patterns.
+    """
+    
+    patterns = list(dict.fromkeys(patterns))   # drop duplicates, keep order
+    output = {pattern: [] for pattern in patterns}
+    suffixes = tuple(pattern for pattern in patterns if not _is_glob(pattern))
+    globs = [pattern for pattern in patterns if _is_glob(pattern)]
+    any_glob = _compile_globs(globs)
+    glob_regexes = [(pattern, _compile_globs([pattern])) for pattern in globs]
+    excluded = _compile_globs(exclude)
+    
+    def match(name, relative_path):
+        if suffixes and name.endswith(suffixes):
+            for suffix in suffixes:
+                if name.endswith(suffix):
+                    output[suffix].append(relative_path)
+        if any_glob is not None and any_glob.match(name):
+            for pattern, regex in glob_regexes:
+                if regex.match(name):
+                    output[pattern].append(relative_path)
+    
+    if os.path.isfile(path):
+        name = os.path.basename(path)
+        if excluded is None or not excluded.match(name):
+            match(name, name)
+        return output
+    
+    prune = None if excluded is None else (lambda entry: excluded.match(entry.name))
+    start = len(os.path.join(path, ""))
+    for entry in _walk(path, prune):
+        match(entry.name, entry.path[start:])
     return output
 
+def _is_glob(pattern):
+    return any(char in pattern for char in "*?[")
+
+def _compile_globs(patterns):
+    """ One regular expression matching any of the glob patterns, None if there are no patterns """
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+def _walk(path, prune=None):
+    """ Iterative depth first traversal of the directory path and all its subdirectories, yielding the
+        os.DirEntry of every file. Entries for which prune(entry) is true are skipped (directories
+        are then never listed).
+        Keep an explicit stack with one iterator over the (os.scandir) entries per open directory level.
+        A subdirectory is pushed onto the stack and walked first, then the walk continues with the
+        remaining entries of its parent.
+        os.scandir already knows the type of each entry, so no extra stat call per path is needed,
+        and as no recursion is used deep trees cannot hit Python's recursion limit.
+    """
+    stack = [_listdir(path)]
+    while stack:
+        for entry in stack[-1]:
+            if prune is not None and prune(entry):
+                continue
+            if entry.is_dir():
+                stack.append(_listdir(entry.path))
+                break
+            if entry.is_file():
+                yield entry
+        else:
+            stack.pop()   # all entries of this directory done
+
+def find_files_parallel(suffix, path, workers=8):
+    """ Same matches as find_files, but directories are listed concurrently by a pool of worker threads.
+        All workers take directories from one shared work queue, put the subdirectories they find back
+        into it and collect their matches into one output list, until the queue is empty.
+        Listing a directory is dominated by syscall latency (network filesystems, cold caches), during which
+        os.scandir releases the GIL - so threads help here even though matching itself is Python code.
+        The order of the output depends on thread timing, sort it if a stable order is needed.
+        The first error raised while listing a directory is re-raised once the walk is done. Any other
+        exception (e.g. a suffix that is no string) stops the walk: the remaining queued directories are
+        drained without listing them, then it is re-raised.
+    """
+    
+    if os.path.isfile(path):
+        return [os.path.basename(path)] if path.endswith(suffix) else []
+    
+    output = []
+    errors = []
+    failed = []     # exceptions other than OSError, they abort the walk
+    work = queue.Queue()
+    work.put(path)
+    
+    def worker():
+        while True:
+            directory = work.get()
+            if directory is None:   # sentinel: walk is done
+                return
+            try:
+                if failed:
+                    continue
+                matches = []
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            work.put(entry.path)
+                        elif entry.is_file() and entry.path.endswith(suffix):
+                            matches.append(entry.name)
+                output.extend(matches)
+            except OSError as error:
+                errors.append(error)
+            except Exception as error:
+                failed.append(error)
+            finally:
+                work.task_done()
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(workers):
+            pool.submit(worker)
+        work.join()                 # every queued directory (incl. ones added meanwhile) is listed
+        for _ in range(workers):
+            work.put(None)
+    
+    if failed:
+        raise failed[0]
+    if errors:
+        raise errors[0]
+    return output
+
+async def aiter_files(suffix, path, max_concurrency=4, executor=None):
+    """ Async generator version of iter_files for asyncio services: yields matching filenames while the
+        event loop keeps running. Every blocking directory listing runs in a thread pool (executor, or a
+        pool of max_concurrency threads created for this walk), and at most max_concurrency directories
+        are listed at the same time. Matches of a directory are yielded as soon as its listing is done,
+        so the order differs from find_files.
+    """
+    loop = asyncio.get_running_loop()
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency)
+    pending = set()
+    try:
+        if await loop.run_in_executor(executor, os.path.isfile, path):
+            if path.endswith(suffix):
+                yield os.path.basename(path)
+            return
+        
+        directories = collections.deque([path])
+        while directories or pending:
+            while directories and len(pending) < max_concurrency:
+                pending.add(loop.run_in_executor(executor, _list_matches, directories.popleft(), suffix))
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for listing in done:
+                subdirectories, matches = listing.result()
+                directories.extend(subdirectories)
+                for name in matches:
+                    yield name
+    finally:
+        for listing in pending:   # caller stopped early
+            listing.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+
+def _list_matches(directory, suffix):
+    """ Blocking helper for aiter_files: subdirectories and matching filenames of one directory """
+    subdirectories = []
+    matches = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirectories.append(entry.path)
+            elif entry.is_file() and entry.path.endswith(suffix):
+                matches.append(entry.name)
+    return subdirectories, matches
+
+class FileIndex(object):
+    """ Persistent index of all files below root, for answering many find_files queries without walking
+        the tree each time.
+        PARAMETERS:
+        ==========
+            self.root = indexed directory
+            self.dirs = mapping directory path -> (mtime in ns, [file names], [subdirectory paths])
+            self.by_ext = mapping extension (".c", "" for none) -> set of file paths
+        refresh() stats every known directory but only lists again the ones whose mtime changed.
+        A directory's mtime changes whenever an entry is added, removed or renamed in it,
+        which is all a name index needs (editing a file's content does not matter).
+        Changes within the filesystem's timestamp resolution of the last refresh can be missed.
+    """
+    
+    def __init__(self, root):
+        self.root = root
+        self.dirs = {}
+        self.by_ext = {}
+        self.refresh()
+    
+    def refresh(self):
+        """ Brings the index up to date, returns the number of directories that were listed again """
+        rescanned = 0
+        seen = set()
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            seen.add(directory)
+            mtime = os.stat(directory).st_mtime_ns
+            known = self.dirs.get(directory)
+            if known is None or known[0] != mtime:
+                self._scan(directory, mtime)
+                rescanned += 1
+            stack.extend(self.dirs[directory][2])
+        
+        for directory in set(self.dirs) - seen:   # removed directories
+            self._forget(directory)
+            del self.dirs[directory]
+        return rescanned
+    
+    def query(self, suffix):
+        """ Paths (in no particular order) of all indexed files ending with suffix. Extension queries (".c")
+            are a single lookup, any other suffix is matched against the indexed names (no filesystem access).
+        """
+        if suffix.startswith(".") and "." not in suffix[1:] and os.sep not in suffix:
+            return list(self.by_ext.get(suffix, ()))
+        return [path for paths in self.by_ext.values() for path in paths if path.endswith(suffix)]
+    
+    def save(self, filename):
+        """ Stores the index, so the next process can start with refresh() instead of a full walk """
+        with open(filename, "wb") as file:
+            pickle.dump((self.root, self.dirs), file, pickle.HIGHEST_PROTOCOL)
+    
+    @classmethod
+    def load(cls, filename):
+        """ Loads an index written by save and refreshes it """
+        with open(filename, "rb") as file:
+            root, dirs = pickle.load(file)
+        index = cls.__new__(cls)
+        index.root = root
+        index.dirs = {}
+        index.by_ext = {}
+        for directory, (mtime, names, subdirs) in dirs.items():
+            index.dirs[directory] = (mtime, names, subdirs)
+            index._add_names(directory, names)
+        index.refresh()
+        return index
+    
+    def _scan(self, directory, mtime):
+        """ Lists directory (again) and updates by_ext with the files that appeared or disappeared """
+        names = []
+        subdirs = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    names.append(entry.name)
+        known = self.dirs.get(directory)
+        if known is None:
+            self._add_names(directory, names)
+        else:
+            old_names = set(known[1])
+            new_names = set(names)
+            self._remove_names(directory, old_names - new_names)
+            self._add_names(directory, new_names - old_names)
+        self.dirs[directory] = (mtime, names, subdirs)
+    
+    def _add_names(self, directory, names):
+        for name in names:
+            self.by_ext.setdefault(_extension(name), set()).add(os.path.join(directory, name))
+    
+    def _remove_names(self, directory, names):
+        for name in names:
+            self.by_ext[_extension(name)].discard(os.path.join(directory, name))
+    
+    def _forget(self, directory):
+        """ Removes the files of directory from by_ext """
+        self._remove_names(directory, self.dirs[directory][1])
+
+def _extension(name):
+    """ Everything from the last dot on, so that a name ends with ".c" exactly if its extension is ".c" """
+    dot = name.rfind(".")
+    return name[dot:] if dot >= 0 else ""
+
+def _listdir(path):
+    """ Iterator over the DirEntry objects of a directory. The entries are read at once, so the
+        directory handle is closed again before descending into the next level.
+    """
+    with os.scandir(path) as entries:
+        return iter(list(entries))
+
+
+def _make_tree(root, num_files, files_per_dir=100, dirs_per_dir=10, suffixes=(".c", ".h", ".txt")):
+    """ Creates a synthetic directory tree below root holding num_files empty files,
+        files_per_dir files in every directory and dirs_per_dir subdirectories per level.
+    """
+    created = 0
+    directories = [root]
+    while created < num_files:
+        next_level = []
+        for directory in directories:
+            for idx in range(files_per_dir):
+                if created >= num_files:
+                    break
+                open(os.path.join(directory, "f{}{}".format(idx, suffixes[idx % len(suffixes)])), "w").close()
+                created += 1
+            if created >= num_files:
+                break
+            for idx in range(dirs_per_dir):
+                subdirectory = os.path.join(directory, "d{}".format(idx))
+                os.mkdir(subdirectory)
+                next_level.append(subdirectory)
+        directories = next_level
+
+def benchmark_find_files(num_files=10**6, rounds=3):
+    """ Times find_files on a synthetic tree of num_files files (created in a temporary directory) """
+    with tempfile.TemporaryDirectory() as root:
+        t0 = time.perf_counter()
+        _make_tree(root, num_files)
+        print("created {} files in {:.1f} s".format(num_files, time.perf_counter() - t0))
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            found = find_files(".c", root)
+            elapsed = time.perf_counter() - t0
+            print("find_files: {} matches in {:.2f} s ({:.0f} files/s)".format(len(found), elapsed, num_files/elapsed))
+
+def benchmark_parallel(num_files=200000, worker_counts=(1, 2, 4, 8, 16), rounds=3):
+    """ Compares find_files with find_files_parallel at several worker counts on a deep synthetic tree
+        (few files and subdirectories per directory). Prints the best of rounds runs.
+    """
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root, num_files, files_per_dir=10, dirs_per_dir=3)
+        runs = [("serial", lambda: find_files(".c", root))]
+        for workers in worker_counts:
+            runs.append(("{} workers".format(workers),
+                         lambda workers=workers: find_files_parallel(".c", root, workers)))
+        for name, run in runs:
+            best = float("inf")
+            for _ in range(rounds):
+                t0 = time.perf_counter()
+                found = run()
+                best = min(best, time.perf_counter() - t0)
+            print("{:<11} {} matches in {:.3f} s".format(name, len(found), best))
+
+def benchmark_index(num_files=200000, changed=0.01):
+    """ Full find_files walk against FileIndex.refresh() + query after renaming changed (1%) of the files """
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root, num_files)
+        t0 = time.perf_counter()
+        index = FileIndex(root)
+        print("build index        {:.3f} s".format(time.perf_counter() - t0))
+        t0 = time.perf_counter()
+        index.refresh()
+        print("refresh, no change {:.3f} s".format(time.perf_counter() - t0))
+        
+        rng = random.Random(42)
+        paths = [path for paths in index.by_ext.values() for path in paths]
+        for path in rng.sample(paths, int(len(paths) * changed)):
+            os.rename(path, path + ".renamed")
+        
+        t0 = time.perf_counter()
+        walked = find_files(".c", root)
+        print("full walk          {:.3f} s, {} matches".format(time.perf_counter() - t0, len(walked)))
+        t0 = time.perf_counter()
+        rescanned = index.refresh()
+        print("index refresh      {:.3f} s, {} of {} directories listed again".format(
+            time.perf_counter() - t0, rescanned, len(index.dirs)))
+        t0 = time.perf_counter()
+        queried = index.query(".c")
+        print("index query        {:.3f} s, {} matches".format(time.perf_counter() - t0, len(queried)))
+
+
+def benchmark_loop_lag(num_files=20000, threshold=0.05):
+    """ Walks a synthetic tree with aiter_files while a ticker task measures how late the event loop
+        wakes it up. Prints the worst lag next to threshold (the loop should never block that long).
+    """
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root, num_files)
+        found, lag = asyncio.run(_max_loop_lag(root))
+        print("{} matches, worst event loop lag {:.1f} ms (threshold {:.0f} ms)".format(
+            found, lag * 1000, threshold * 1000))
+
+async def _max_loop_lag(root, interval=0.005):
+    """ Walks root while a ticker measures how late the event loop wakes it up """
+    lags = []
+    walking = True
+    
+    async def ticker():
+        while walking:
+            t0 = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - t0 - interval)
+    
+    tick = asyncio.create_task(ticker())
+    found = [name async for name in aiter_files(".c", root)]
+    walking = False
+    await tick
+    return len(found), max(lags)
+
 
 path = os.path.join(os.getcwd()+"/desktop/testdir")
 
@@ -46,3 +446,65 @@ print(find_files("", path))
 
 print(find_files(".xxx", path))
 # []
+
+### Streaming ###
+
+print(list(itertools.islice(iter_files(".h", path), 2)))
+# ['b.h', 'a.h'] (the walk stops after the second match)
+
+### Parallel ###
+
+print(sorted(find_files_parallel(".c", path, workers=4)))
+# ['a.c', 'a.c', 'b.c', 't1.c']
+
+### Index ###
+
+index = FileIndex(path)
+print([os.path.basename(p) for p in sorted(index.query(".c"))])
+# ['a.c', 'b.c', 'a.c', 't1.c'] (sorted by full path)
+open(os.path.join(path, "new.c"), "w").close()
+print(index.refresh(), len(index.query(".c")))
+# 1 5 (only the root directory changed)
+os.remove(os.path.join(path, "new.c"))
+
+### Multiple patterns ###
+
+print(find_files_multi([".c", "a.*"], path, exclude=["subdir5"]))
+# {'.c': ['subdir3/subsubdir1/b.c', 't1.c', 'subdir1/a.c'], 'a.*': ['subdir1/a.c', 'subdir1/a.h']}
+
+### Async ###
+
+async def collect(suffix, path):
+    return [name async for name in aiter_files(suffix, path)]
+
+print(sorted(asyncio.run(collect(".h", path))))
+# ['a.h', 'a.h', 'b.h', 't1.h']
+
+with tempfile.TemporaryDirectory() as root:
+    _make_tree(root, 300)
+    print(len(asyncio.run(collect(".c", root))))
+# 102
+
+### Deep tree (deeper than the recursion limit) ###
+
+root = tempfile.mkdtemp()
+deep = root
+for _ in range(1500):
+    deep = os.path.join(deep, "d")
+    os.mkdir(deep)
+open(os.path.join(deep, "deep.c"), "w").close()
+print(find_files(".c", root))
+# ['deep.c']
+os.remove(os.path.join(deep, "deep.c"))
+while deep != root:   # shutil.rmtree is recursive itself, remove level by level
+    os.rmdir(deep)
+    deep = os.path.dirname(deep)
+os.rmdir(root)
+
+
+### Benchmarks ### (uncomment to run, creating the tree takes a while)
+
+# benchmark_find_files()
+# benchmark_parallel()
+# benchmark_index()
+# benchmark_loop_lag()
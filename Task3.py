@@ -1,4 +1,25 @@
+import collections
+import cProfile
+import concurrent.futures
+import heapq
+import io
+import json
+import multiprocessing
+import operator
+import os
+import pstats
+import random
 import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from array import array
+
+try:
+    import numpy
+except ImportError:     # optional, only speeds up counting in bytes mode
+    numpy = None
 
 class HuffmanNode(object):
     
@@ -44,9 +65,17 @@ class HuffmanHeap(object):
         self.count_dict = {}
     
     def count_freq(self, data):
-        """ Count frequency of each unique character in the given data """
-        for char in data:
-            self.count_dict[char] = self.count_dict.get(char, 0) + 1
+        """ Count frequency of each unique character in the given data.
+            Bytes-like data is counted over the fixed alphabet of 256 byte values (int identities),
+            vectorized with numpy if it is installed (see _count_bytes).
+        """
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            counts = enumerate(_count_bytes(data))
+        else:
+            counts = collections.Counter(data).items()     # counting loop runs in C
+        for char, frequency in counts:
+            if frequency:
+                self.count_dict[char] = self.count_dict.get(char, 0) + frequency
         
     def init_insert(self):
         """ Initialize the heap tree """
@@ -55,12 +84,9 @@ class HuffmanHeap(object):
             self.tree[self.next_idx] = HuffmanNode(identity, frequency, code=0)
             self._upstream_heapify()   # sort as a MinHeap
             self.next_idx += 1
-            # if initial array size too small, increase dimensions
+            # if initial array size too small, double it in place
             if self.next_idx >= len(self.tree):
-                temp = self.tree
-                self.tree = [None for _ in range(len(temp)*2)]
-                for idx, item in enumerate(temp):
-                    self.tree[idx] = item
+                self.tree.extend([None] * len(self.tree))
                     
     def insert(self, node):
         """ When creating the tree, reinsert the current 
@@ -120,88 +146,808 @@ class HuffmanHeap(object):
             self.insert(new_node)
             
             
-    def left_child(self, idx):
-        """ Helper function for down-heapifying, returns left childs index and node
-            if the left child exists 
-        """
-        child_idx = 2 * idx + 1
-        if child_idx < self.next_idx:
-            return (child_idx, self.tree[child_idx])
-        else:
-            return (child_idx, None)
-    
-    def right_child(self, idx):
-        """ Helper function for down-heapifying, returns right childs index and node
-            if the right child exists 
-        """
-        child_idx = 2 * idx + 2
-        if child_idx < self.next_idx:
-            return (child_idx, self.tree[child_idx])
-        else:
-            return (child_idx, None)
-        
-            
-    def switch(self, idx1, idx2):
-        """ Change nodes in the heap-tree with respect to indices """
-        self.tree[idx1], self.tree[idx2] = self.tree[idx2], self.tree[idx1]
-             
-                
     def _downstream_heapify(self, parent_idx = 0):
-        """ Pass a node from root down to its matching index """
-        node = self.tree[parent_idx] # root
-        if parent_idx < self.next_idx: # assert node index is not out of range
-            left_idx, left = self.left_child(parent_idx) # get left child
-            right_idx, right = self.right_child(parent_idx) # get right child
+        """ Pass a node from root down to its matching index (loop, no recursion) """
+        tree = self.tree
+        size = self.next_idx
+        while parent_idx < size: # assert node index is not out of range
+            node = tree[parent_idx]
+            left_idx = 2 * parent_idx + 1
+            right_idx = left_idx + 1
+            min_idx = parent_idx
             min_element = node.frequency
-            if left != None: # compare parent to left child if left child exists
-                min_element = min(min_element, left.frequency)
-            if right != None: # compare parent to right child if left right exists
-                min_element = min(min_element, right.frequency)
-            if min_element == node.frequency:
+            # ties keep the parent, then prefer the left child
+            if left_idx < size and tree[left_idx].frequency < min_element:
+                min_idx = left_idx
+                min_element = tree[left_idx].frequency
+            if right_idx < size and tree[right_idx].frequency < min_element:
+                min_idx = right_idx
+            if min_idx == parent_idx:
                 return # don't change anything if parent is the min-node
-            elif min_element == left.frequency:
-                self.switch(parent_idx, left_idx)   # change parent and left node
-                self._downstream_heapify(left_idx)  # recursively call down-heap on left node
-            elif min_element == right.frequency:   
-                self.switch(parent_idx, right_idx)  # change parent and right node
-                self._downstream_heapify(right_idx) # recursively call down-heap on right node
+            tree[parent_idx], tree[min_idx] = tree[min_idx], node   # change parent and child node
+            parent_idx = min_idx
     
 def huffman_encoding(data):
     """ Encode a text message into binary 0-1 bit integer sequences. """
-    assert data != "", "Please provide a non-empty string"
+    tree, encoding_dict = _build_codes(data)
+    
+    # encode the data (joining once instead of growing a string char by char)
+    encoded_data = "".join(encoding_dict[char] for char in data)
+    
+    return encoded_data, tree, encoding_dict
+
+
+def _build_codes(data):
+    """ Build the HuffmanHeap tree for data and return it with its encoding_dict (char -> 0/1 code) """
+    assert len(data) > 0, "Please provide a non-empty string"
     tree = HuffmanHeap()    # initialize the HuffmanHeap
     tree.count_freq(data)   # count frequency and create nodes
-
     tree.init_insert()      # initialise a sorted heap with nodes
     tree.heap_sort()        # build the real tree
     
-    # get binary code
-    root = tree.tree[0]     # start at the root
+    # get binary code: DFS (depth first search) with an explicit stack, deep trees can't overflow
     encoding_dict = {}      # dict object holding code for unique chars
-    temp = ""
+    stack = [(tree.tree[0], "")]    # start at the root
+    while stack:
+        node, temp = stack.pop()
+        if node.code is not None:     # root node will not hold code
+            temp += str(node.code)
+        if node.identity is not None: # fusion nodes are not unique chars
+            encoding_dict[node.identity] = temp # map char -> 0/1 code
+        # push right first, so all left children are visited first
+        if node.right is not None:
+            stack.append((node.right, temp))
+        if node.left is not None:
+            stack.append((node.left, temp))
+    return tree, encoding_dict
+
+
+def build_tree(count_dict):
+    """ Build a Huffman tree for a mapping char -> frequency and return its root HuffmanNode.
+        Uses the two-queue method (O(n)) if the frequencies are already in ascending order, else heapq
+        (O(n log n)). Equal frequencies are resolved by order: leaves (in count_dict order) before merged
+        nodes (in creation order), so both methods build the same tree for the same counts.
+    """
+    leaves = [HuffmanNode(char, frequency) for char, frequency in count_dict.items()]
+    if not leaves:
+        raise ValueError("count_dict is empty")
+    if len(leaves) == 1:
+        leaves[0].code = 0      # a single char still gets a 1 bit code
+        return leaves[0]
+    frequencies = [leaf.frequency for leaf in leaves]
+    if all(map(operator.le, frequencies, frequencies[1:])):
+        return _two_queue_tree(leaves)
+    return _heapq_tree(leaves)
+
+
+def _heapq_tree(leaves):
+    """ build_tree with heapq: entries (frequency, order, node), order breaks ties """
+    heap = [(leaf.frequency, order, leaf) for order, leaf in enumerate(leaves)]
+    heapq.heapify(heap)
+    order = len(heap)
+    while len(heap) > 1:
+        frequency_one, _, one = heapq.heappop(heap)
+        frequency_two, _, two = heapq.heappop(heap)
+        one.code = 0
+        two.code = 1
+        frequency = frequency_one + frequency_two
+        heapq.heappush(heap, (frequency, order, HuffmanNode(None, frequency, one, two)))
+        order += 1
+    return heap[0][2]
+
+
+def _two_queue_tree(leaves):
+    """ build_tree for leaves sorted by frequency: merged nodes are created in ascending order too, so
+        the two lowest nodes are always at the front of the leaf queue or the merged queue
+    """
+    merged = collections.deque()
+    leaf_idx = 0
+    
+    def pop_lowest():
+        nonlocal leaf_idx
+        if leaf_idx < len(leaves) and (not merged or leaves[leaf_idx].frequency <= merged[0].frequency):
+            leaf_idx += 1
+            return leaves[leaf_idx - 1]
+        return merged.popleft()
     
-    def traverse_rec(node, temp):
-        """ Traverse the tree in DFS (depth first search)"""
+    for _ in range(len(leaves) - 1):
+        one = pop_lowest()
+        two = pop_lowest()
+        one.code = 0
+        two.code = 1
+        merged.append(HuffmanNode(None, one.frequency + two.frequency, one, two))
+    return merged[0]
+
+
+def code_lengths(root):
+    """ Mapping char -> code length (depth) for a tree from build_tree, iterative """
+    if root.identity is not None:
+        return {root.identity: 1}
+    lengths = {}
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node.identity is not None:
+            lengths[node.identity] = depth
+        else:
+            stack.append((node.right, depth + 1))
+            stack.append((node.left, depth + 1))
+    return lengths
 
-        if node:
-            if node.code is not None:     # root node will not hold code
-                temp += str(node.code)
-            if node.identity is not None: # fusion nodes are not unique chars
-                encoding_dict[node.identity] = temp # map char -> 0/1 code
-            traverse_rec(node.left, temp)  # go all left children
-            traverse_rec(node.right, temp) # go all rright children
-        return encoding_dict
+
+def huffman_encoding_packed(data):
+    """ Encode a text message like huffman_encoding, but with 8 bits per byte:
+        returns the packed bits (bytes, last byte padded with zeros), the number of valid bits,
+        the root HuffmanNode of the tree (see build_tree) and the encoding_dict. The codes are
+        canonical Huffman codes (see canonical_codes) with the same lengths as the codes of the tree.
+    """
+    assert len(data) > 0, "Please provide a non-empty string"
+    counter = HuffmanHeap()
+    counter.count_freq(data)
+    tree = build_tree(counter.count_dict)
+    encoding_dict = canonical_codes(code_lengths(tree))
+    payload, bit_length = _pack_bits(data, encoding_dict)
+    return payload, bit_length, tree, encoding_dict
+
+
+def _pack_bits(data, encoding_dict, chunk_size=1 << 16):
+    """ Pack the codes of all chars in data into bytes. Works chunk by chunk: the 0/1 string of a chunk
+        is built with one join and converted to bytes via int(bits, 2), bits that do not fill a whole
+        byte are carried over to the next chunk.
+    """
+    output = bytearray()
+    pending = ""
+    for start in range(0, len(data), chunk_size):
+        bits = pending + "".join(map(encoding_dict.__getitem__, data[start:start+chunk_size]))
+        usable = len(bits) - len(bits) % 8
+        if usable:
+            output += int(bits[:usable], 2).to_bytes(usable // 8, "big")
+        pending = bits[usable:]
+    bit_length = 8 * len(output) + len(pending)
+    if pending:
+        output.append(int(pending.ljust(8, "0"), 2))
+    return bytes(output), bit_length
+
+
+def canonical_codes(lengths):
+    """ Canonical Huffman codes for a mapping char -> code length: chars sorted by (length, char)
+        get consecutive binary numbers, shifted left whenever the length grows. Only the lengths are
+        needed to rebuild the exact same codes, and all codes of one length are a contiguous range.
+    """
+    encoding_dict = {}
+    code = 0
+    prev_length = 0
+    for char, length in sorted(lengths.items(), key=lambda item: (item[1], item[0])):
+        code <<= length - prev_length
+        encoding_dict[char] = format(code, "0{}b".format(length))
+        code += 1
+        prev_length = length
+    return encoding_dict
+
+
+class DecodeTable(object):
+    """ Lookup tables for decoding a prefix code table_bits bits at a time instead of bit by bit.
+        PARAMETERS:
+        ==========
+            self.table_bits = number of bits (K) looked at per lookup
+            self.single_char / self.single_length = for every K bit window: the char whose code starts
+                                                    the window and its code length (0 = code longer than K)
+            self.chunks / self.used = for every K bit window: all chars whose codes fit completely into
+                                      the window (one or more) and the number of bits they use
+            self.long_codes = mapping (length, code) -> char for codes longer than K bits
+        Int chars (bytes mode, see HuffmanHeap.count_freq) are decoded to bytes instead of str.
+    """
     
-    encoding_dict = traverse_rec(root, temp)
+    def __init__(self, encoding_dict, table_bits=12):
+        # no wider than the longest code: small alphabets (short messages) get small tables
+        self.max_length = max(map(len, encoding_dict.values()), default=1)
+        table_bits = self.table_bits = min(table_bits, self.max_length)
+        size = 1 << table_bits
+        mask = size - 1
+        self.single_char = [None] * size
+        self.single_length = [0] * size
+        self.long_codes = {}
+        self.empty = ""
+        for char, code in encoding_dict.items():
+            if isinstance(char, int):
+                char = bytes((char,))
+                self.empty = b""
+            length = len(code)
+            if length > table_bits:
+                self.long_codes[(length, int(code, 2))] = char
+                continue
+            # every window starting with code decodes to char
+            first = int(code, 2) << (table_bits - length)
+            for window in range(first, first + (1 << (table_bits - length))):
+                self.single_char[window] = char
+                self.single_length[window] = length
         
-    # encode the data
-    encoded_data = ""
-    for char in data:
-        if char in encoding_dict.keys():
-            encoded_data += encoding_dict[char]
+        self.chunks = [None] * size
+        self.used = [0] * size
+        for window in range(size):
+            total = self.single_length[window]
+            if total == 0:
+                continue
+            chars = [self.single_char[window]]
+            while total < table_bits:
+                # remaining bits moved to the front, the unknown bits behind them are zero, so the
+                # next char only counts if its whole code lies within the remaining bits
+                next_window = (window << total) & mask
+                length = self.single_length[next_window]
+                if length == 0 or length > table_bits - total:
+                    break
+                chars.append(self.single_char[next_window])
+                total += length
+            self.chunks[window] = self.empty.join(chars)
+            self.used[window] = total
     
-    return encoded_data, tree, encoding_dict
+    def decode(self, payload, bit_length):
+        """ Decode the first bit_length bits of payload """
+        K = self.table_bits
+        mask = (1 << K) - 1
+        chunks = self.chunks
+        used = self.used
+        # read the payload as big endian 64 bit words, with enough zero words for a lookahead of max_length
+        size = (bit_length + 7) // 8
+        padded = bytes(payload[:size]) + bytes(8 - size % 8 + 8 * (self.max_length // 64 + 1))
+        words = array("Q", padded)
+        if sys.byteorder == "little":
+            words.byteswap()
+        
+        decoded = []
+        append = decoded.append
+        acc = 0; nbits = 0; word_idx = 0
+        remaining = bit_length
+        while remaining >= K:
+            if nbits < K:
+                acc = ((acc & ((1 << nbits) - 1)) << 64) | words[word_idx]
+                word_idx += 1
+                nbits += 64
+            window = (acc >> (nbits - K)) & mask
+            bits = used[window]
+            if bits:
+                append(chunks[window])
+            else:
+                while nbits < self.max_length:   # codes can be longer than one word
+                    acc = ((acc & ((1 << nbits) - 1)) << 64) | words[word_idx]
+                    word_idx += 1
+                    nbits += 64
+                char, bits = self._decode_long(acc, nbits)
+                append(char)
+            nbits -= bits
+            remaining -= bits
+        
+        # tail: fewer than K valid bits left, only trust single chars whose code fits into them
+        while remaining > 0:
+            while nbits < self.max_length:
+                acc = ((acc & ((1 << nbits) - 1)) << 64) | words[word_idx]
+                word_idx += 1
+                nbits += 64
+            window = (acc >> (nbits - K)) & mask
+            bits = self.single_length[window]
+            if bits:
+                char = self.single_char[window]
+            else:
+                char, bits = self._decode_long(acc, nbits)
+            if bits > remaining:
+                raise ValueError("Corrupt data: last code is incomplete")
+            append(char)
+            nbits -= bits
+            remaining -= bits
+        return self.empty.join(decoded)
+    
+    def _decode_long(self, acc, nbits):
+        """ Slow path for codes longer than table_bits: try the next bits of acc length by length """
+        for length in range(self.table_bits + 1, self.max_length + 1):
+            code = (acc >> (nbits - length)) & ((1 << length) - 1)
+            char = self.long_codes.get((length, code))
+            if char is not None:
+                return char, length
+        raise ValueError("Corrupt data: no code matches")
+
+
+def huffman_decoding_packed(payload, bit_length, encoding_dict):
+    """ Decode bytes produced by huffman_encoding_packed back to the original text (see DecodeTable) """
+    return DecodeTable(encoding_dict).decode(payload, bit_length)
+
+
+MAGIC = b"HUF"
+TEXT = 0        # kind of data after MAGIC: str
+BYTES = 1       # kind of data after MAGIC: bytes (code lengths stored for chr(byte))
+
+
+def huffman_compress(data):
+    """ Encode a text message (str) or binary data (bytes) into self-describing bytes: any process
+        can decode them with huffman_decompress without the tree or encoding_dict.
+        Format: MAGIC, kind byte, number of payload bits (varint), code lengths (see
+        _write_code_lengths), payload (packed canonical codes).
+    """
+    kind = _kind(data)
+    output = bytearray(MAGIC)
+    output.append(kind)
+    if not data:
+        _write_varint(output, 0)
+        _write_code_lengths(output, {})
+        return bytes(output)
+    
+    payload, bit_length, _, encoding_dict = huffman_encoding_packed(data)
+    _write_varint(output, bit_length)
+    if kind == BYTES:
+        _write_code_lengths(output, {chr(byte): len(code) for byte, code in encoding_dict.items()})
+    else:
+        _write_code_lengths(output, {char: len(code) for char, code in encoding_dict.items()})
+    output += payload
+    return bytes(output)
+
+
+def huffman_decompress(blob):
+    """ Decode bytes produced by huffman_compress, returns str or bytes like the original data """
+    if blob[:len(MAGIC)] != MAGIC or blob[len(MAGIC)] not in (TEXT, BYTES):
+        raise ValueError("Not a huffman_compress output")
+    kind = blob[len(MAGIC)]
+    bit_length, pos = _read_varint(blob, len(MAGIC) + 1)
+    lengths, pos = _read_code_lengths(blob, pos)
+    if bit_length == 0:
+        return b"" if kind == BYTES else ""
+    if kind == BYTES:
+        lengths = {ord(char): length for char, length in lengths.items()}
+    return DecodeTable(canonical_codes(lengths)).decode(memoryview(blob)[pos:], bit_length)
+
+
+def _kind(data):
+    """ Kind byte for data: BYTES for bytes-like data, else TEXT """
+    return BYTES if isinstance(data, (bytes, bytearray, memoryview)) else TEXT
+
+
+def _count_bytes(data):
+    """ Frequency of each of the 256 byte values in data, as a list indexed by byte value.
+        numpy.bincount over a frombuffer view if numpy is installed, else collections.Counter.
+    """
+    if numpy is not None:
+        return numpy.bincount(numpy.frombuffer(data, dtype=numpy.uint8), minlength=256).tolist()
+    counts = [0] * 256
+    for byte, frequency in collections.Counter(data).items():
+        counts[byte] = frequency
+    return counts
+
+
+def _write_code_lengths(output, lengths):
+    """ Append the code length table: the longest length (varint), then for every length from 1 to the
+        longest one the chars with codes of this length, UTF-8 encoded (size in bytes as varint + bytes).
+        Together with canonical_codes this is all a decoder needs - typically a few dozen bytes.
+    """
+    by_length = {}
+    for char, length in lengths.items():
+        by_length.setdefault(length, []).append(char)
+    max_length = max(by_length, default=0)
+    _write_varint(output, max_length)
+    for length in range(1, max_length + 1):
+        chars = "".join(sorted(by_length.get(length, ()))).encode("utf-8", "surrogatepass")
+        _write_varint(output, len(chars))
+        output += chars
+
+
+def _read_code_lengths(blob, pos):
+    """ Read a code length table written by _write_code_lengths, returns (lengths, new position) """
+    lengths = {}
+    max_length, pos = _read_varint(blob, pos)
+    for length in range(1, max_length + 1):
+        size, pos = _read_varint(blob, pos)
+        for char in bytes(blob[pos:pos+size]).decode("utf-8", "surrogatepass"):
+            lengths[char] = length
+        pos += size
+    return lengths, pos
+
+
+def _write_varint(output, value):
+    """ Append a non negative int in 7 bit groups, lowest first (high bit set = more bytes follow) """
+    while value >= 0x80:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _read_varint(blob, pos):
+    """ Read a varint written by _write_varint, returns (value, new position) """
+    value = 0
+    shift = 0
+    while True:
+        byte = blob[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+STREAM_MAGIC = b"HUS"
+
+
+def compress_stream(source, target, chunk_size=1 << 20, sample_size=None):
+    """ Compress a text (or binary) file object (source) into a binary file object (target) with bounded
+        memory, for inputs larger than RAM. Only chunk_size chars (bytes) are held in memory at a time.
+        Model: with sample_size None, a first pass counts the frequencies of the whole input and the
+        source is rewound (it has to be seekable). Else the codes are built from the first sample_size
+        chars only - single pass, works on pipes, but a char that does not occur in the sample
+        raises ValueError.
+        Format: STREAM_MAGIC, kind byte, code lengths (see _write_code_lengths), then frames of
+        number of payload bits (varint) + payload, one per chunk, ended by a frame of 0 bits.
+        Returns the number of bytes written.
+    """
+    tree = HuffmanHeap()
+    buffered = source.read(0)      # "" or b"": tells text from binary sources
+    kind = _kind(buffered)
+    if sample_size is None:
+        start = source.tell()
+        chunk = source.read(chunk_size)
+        while chunk:
+            tree.count_freq(chunk)
+            chunk = source.read(chunk_size)
+        source.seek(start)
+    else:
+        buffered = source.read(sample_size)
+        tree.count_freq(buffered)
+    
+    header = bytearray(STREAM_MAGIC)
+    header.append(kind)
+    encoding_dict = {}
+    if tree.count_dict:
+        encoding_dict = canonical_codes(code_lengths(build_tree(tree.count_dict)))
+    if kind == BYTES:
+        _write_code_lengths(header, {chr(byte): len(code) for byte, code in encoding_dict.items()})
+    else:
+        _write_code_lengths(header, {char: len(code) for char, code in encoding_dict.items()})
+    target.write(header)
+    written = len(header)
+    
+    chunk = buffered or source.read(chunk_size)
+    while chunk:
+        try:
+            payload, bit_length = _pack_bits(chunk, encoding_dict)
+        except KeyError as error:
+            raise ValueError("Char {!r} does not occur in the sample, use a larger sample_size".format(
+                error.args[0])) from None
+        frame = bytearray()
+        _write_varint(frame, bit_length)
+        frame += payload
+        target.write(frame)
+        written += len(frame)
+        chunk = source.read(chunk_size)
+    target.write(b"\0")    # end of stream
+    return written + 1
+
+
+def decompress_stream(source, target):
+    """ Decode a binary file object written by compress_stream into a text file object (binary for
+        compressed bytes), frame by frame. Returns the number of chars (bytes) written.
+    """
+    if source.read(len(STREAM_MAGIC)) != STREAM_MAGIC:
+        raise ValueError("Not a compress_stream output")
+    kind = source.read(1)
+    if kind not in (bytes([TEXT]), bytes([BYTES])):
+        raise ValueError("Not a compress_stream output")
+    lengths = {}
+    max_length = _read_varint_from(source)
+    for length in range(1, max_length + 1):
+        size = _read_varint_from(source)
+        for char in source.read(size).decode("utf-8", "surrogatepass"):
+            lengths[ord(char) if kind[0] == BYTES else char] = length
+    
+    table = DecodeTable(canonical_codes(lengths)) if lengths else None
+    written = 0
+    bit_length = _read_varint_from(source)
+    while bit_length:
+        text = table.decode(source.read((bit_length + 7) // 8), bit_length)
+        target.write(text)
+        written += len(text)
+        bit_length = _read_varint_from(source)
+    return written
+
+
+def _read_varint_from(stream):
+    """ Read a varint written by _write_varint from a binary file object """
+    value = 0
+    shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            raise ValueError("Unexpected end of stream")
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+BLOCK_MAGIC = b"HUB"
+
+
+def compress_blocks(data, block_size=1 << 20, workers=None):
+    """ Split a text message (or bytes) into independent blocks of block_size chars and compress each one with
+        huffman_compress (own tree per block) in a pool of worker processes.
+        Format: BLOCK_MAGIC, kind byte, number of blocks (varint), block index (compressed size of
+        every block as varint), then the blocks. Any block can be decoded alone (see read_block).
+        workers=1 compresses in the current process, None uses one process per core.
+    """
+    blocks = [data[i:i+block_size] for i in range(0, len(data), block_size)]
+    with _block_executor(workers, len(blocks)) as executor:
+        compressed = list(executor.map(huffman_compress, blocks))
+    
+    output = bytearray(BLOCK_MAGIC)
+    output.append(_kind(data))
+    _write_varint(output, len(compressed))
+    for blob in compressed:
+        _write_varint(output, len(blob))
+    for blob in compressed:
+        output += blob
+    return bytes(output)
+
+
+def decompress_blocks(blob, workers=None):
+    """ Decode bytes produced by compress_blocks, one block per task in a pool of worker processes """
+    blocks = [blob[start:end] for start, end in _read_block_index(blob)]
+    empty = b"" if blob[len(BLOCK_MAGIC)] == BYTES else ""
+    with _block_executor(workers, len(blocks)) as executor:
+        return empty.join(executor.map(huffman_decompress, blocks))
+
+
+def read_block(blob, index):
+    """ Decode only block number index of bytes produced by compress_blocks """
+    start, end = _read_block_index(blob)[index]
+    return huffman_decompress(blob[start:end])
+
+
+def _read_block_index(blob):
+    """ Read the block index of compress_blocks output, returns a list of (start, end) of every block """
+    if blob[:len(BLOCK_MAGIC)] != BLOCK_MAGIC or blob[len(BLOCK_MAGIC)] not in (TEXT, BYTES):
+        raise ValueError("Not a compress_blocks output")
+    count, pos = _read_varint(blob, len(BLOCK_MAGIC) + 1)
+    sizes = []
+    for _ in range(count):
+        size, pos = _read_varint(blob, pos)
+        sizes.append(size)
+    spans = []
+    for size in sizes:
+        spans.append((pos, pos + size))
+        pos += size
+    return spans
+
+
+class _InlineExecutor(object):
+    """ Executor stand-in that maps in the current process (workers=1 or a single block) """
+    
+    def map(self, function, items):
+        return map(function, items)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+def _block_executor(workers, tasks):
+    """ Process pool for the block functions. Uses fork on Linux, so the workers start without importing
+        this script again; elsewhere the platform default (spawn on Windows and macOS, where fork is
+        unsafe) imports it in every worker, so call the block functions with workers > 1 only under
+        if __name__ == "__main__". Never start a pool while this module is being imported: forked
+        workers would wait for the import lock held by the parent.
+    """
+    workers = min(workers or os.cpu_count() or 1, tasks)
+    if workers <= 1:
+        return _InlineExecutor()
+    context = None
+    if sys.platform.startswith("linux"):
+        context = multiprocessing.get_context("fork")
+    return concurrent.futures.ProcessPoolExecutor(workers, mp_context=context)
+
+
+ESCAPE = ""          # codebook symbol for chars that did not occur in the training corpus
+ESCAPE_BITS = 21     # an escaped char is written as its code point with this many bits
+
+
+class Codebook(object):
+    """ Canonical Huffman codes trained once on a sample corpus and reused for many short messages,
+        so no tree has to be built or shipped per message.
+        PARAMETERS:
+        ==========
+            self.codebook_id = int identifying the codebook (see compress_message / CodebookCache),
+                               defaults to the CRC32 of to_bytes()
+            self.encoding_dict = char -> 0/1 code for every char of the training corpus
+            self.escape_code = code of ESCAPE, followed by ESCAPE_BITS bits of the code point for
+                               chars without a code of their own
+            self.table = DecodeTable for messages without escaped chars
+    """
+    
+    def __init__(self, lengths, codebook_id=None):
+        self.encoding_dict = canonical_codes(lengths)
+        self.escape_code = self.encoding_dict.pop(ESCAPE)
+        self.table = DecodeTable(self.encoding_dict) if self.encoding_dict else None
+        self._by_code = None     # code -> char including ESCAPE, built on the first escaped message
+        self.codebook_id = zlib.crc32(self.to_bytes()) if codebook_id is None else codebook_id
+    
+    @classmethod
+    def train(cls, corpus, codebook_id=None):
+        """ Build a codebook from a sample text or an iterable of sample messages """
+        counter = HuffmanHeap()
+        for message in ([corpus] if isinstance(corpus, str) else corpus):
+            counter.count_freq(message)
+        counter.count_dict[ESCAPE] = 1
+        return cls(code_lengths(build_tree(counter.count_dict)), codebook_id)
+    
+    def encode(self, message):
+        """ Encode a message: (number of bits << 1 | escaped flag) as varint + packed codes """
+        codes = self.encoding_dict
+        try:
+            bits = "".join(map(codes.__getitem__, message))
+            escaped = 0
+        except KeyError:
+            escape = self.escape_code
+            bits = "".join(codes[char] if char in codes else escape + format(ord(char), "021b")
+                           for char in message)
+            escaped = 1
+        output = bytearray()
+        _write_varint(output, len(bits) << 1 | escaped)
+        if bits:
+            size = (len(bits) + 7) // 8
+            output += int(bits.ljust(8 * size, "0"), 2).to_bytes(size, "big")
+        return bytes(output)
+    
+    def decode(self, blob, pos=0):
+        """ Decode a message encoded by encode, starting at blob[pos] """
+        header, pos = _read_varint(blob, pos)
+        bit_length = header >> 1
+        if not header & 1:
+            return self.table.decode(memoryview(blob)[pos:], bit_length) if bit_length else ""
+        
+        # escaped chars: slow bit string walk, only for messages with chars unseen in training
+        if self._by_code is None:
+            self._by_code = {code: char for char, code in self.encoding_dict.items()}
+            self._by_code[self.escape_code] = ESCAPE
+        size = (bit_length + 7) // 8
+        bits = format(int.from_bytes(blob[pos:pos+size], "big"), "0{}b".format(8 * size))[:bit_length]
+        decoded = []
+        start = 0
+        while start < bit_length:
+            end = start + 1
+            while bits[start:end] not in self._by_code:
+                if end >= bit_length:
+                    raise ValueError("Corrupt data: no code matches")
+                end += 1
+            char = self._by_code[bits[start:end]]
+            if char == ESCAPE:
+                char = chr(int(bits[end:end+ESCAPE_BITS], 2))
+                end += ESCAPE_BITS
+            decoded.append(char)
+            start = end
+        return "".join(decoded)
+    
+    def to_bytes(self):
+        """ Serialize the code lengths: escape code length (varint) + _write_code_lengths table """
+        output = bytearray()
+        _write_varint(output, len(self.escape_code))
+        _write_code_lengths(output, {char: len(code) for char, code in self.encoding_dict.items()})
+        return bytes(output)
+    
+    @classmethod
+    def from_bytes(cls, blob, codebook_id=None):
+        """ Rebuild a codebook serialized with to_bytes """
+        escape_length, pos = _read_varint(blob, 0)
+        lengths, _ = _read_code_lengths(blob, pos)
+        lengths[ESCAPE] = escape_length
+        return cls(lengths, codebook_id)
+
+
+class CodebookCache(object):
+    """ LRU cache of Codebooks keyed by codebook_id (same policy as LRU_Cache of Task1, on an OrderedDict).
+        loader(codebook_id) is called on a miss to fetch the codebook, e.g. from disk via from_bytes;
+        without a loader a miss raises KeyError.
+    """
+    
+    def __init__(self, capacity=16, loader=None):
+        self.capacity = capacity
+        self.loader = loader
+        self.codebooks = collections.OrderedDict()
+    
+    def get(self, codebook_id):
+        """ Return the codebook with codebook_id and mark it as most recently used """
+        codebook = self.codebooks.get(codebook_id)
+        if codebook is not None:
+            self.codebooks.move_to_end(codebook_id)
+            return codebook
+        if self.loader is None:
+            raise KeyError(codebook_id)
+        codebook = self.loader(codebook_id)
+        self.add(codebook)
+        return codebook
+    
+    def add(self, codebook):
+        """ Insert a codebook, evicting the least recently used one when full """
+        self.codebooks[codebook.codebook_id] = codebook
+        self.codebooks.move_to_end(codebook.codebook_id)
+        if len(self.codebooks) > self.capacity:
+            self.codebooks.popitem(last=False)
+    
+    def __len__(self):
+        return len(self.codebooks)
+
+
+def compress_message(message, codebook):
+    """ Encode a short message with a trained codebook: codebook_id (varint) + Codebook.encode """
+    output = bytearray()
+    _write_varint(output, codebook.codebook_id)
+    return bytes(output) + codebook.encode(message)
+
+
+def decompress_message(blob, cache):
+    """ Decode bytes produced by compress_message, looking the codebook up in a CodebookCache """
+    codebook_id, pos = _read_varint(blob, 0)
+    return cache.get(codebook_id).decode(blob, pos)
+
+
+def _decoding_trie(payload, bit_length, encoding_dict):
+    """ Reference decoder walking a binary trie of the codes bit by bit (used by benchmark_decoding).
+        The codes are put into nested [left, right] lists, a leaf is a 1-tuple holding its char,
+        and the trie is walked restarting at the root after every leaf.
+    """
+    root = [None, None]
+    for char, code in encoding_dict.items():
+        node = root
+        for bit in code[:-1]:
+            idx = bit == "1"
+            if node[idx] is None:
+                node[idx] = [None, None]
+            node = node[idx]
+        node[code[-1] == "1"] = (char,)
+    
+    decoded = []
+    node = root
+    chunk_size = 1 << 14
+    num_bytes = (bit_length + 7) // 8
+    for start in range(0, num_bytes, chunk_size):
+        chunk = payload[start:min(start+chunk_size, num_bytes)]
+        bits = format(int.from_bytes(chunk, "big"), "0{}b".format(8 * len(chunk)))
+        if start + chunk_size >= num_bytes:
+            bits = bits[:bit_length - 8 * start]    # drop the padding
+        for bit in bits:
+            node = node[bit == "1"]
+            if node.__class__ is tuple:
+                decoded.append(node[0])
+                node = root
+    return "".join(decoded)
+
+
+def _sample_text(size, seed=42):
+    """ Pseudo English text of size chars (common words with Zipf like frequencies) for benchmarks """
+    words = ("the of and to a in is it you that he was for on are with as I his they be at one have "
+             "this from or had by hot word but what some we can out other were all there when up use "
+             "your how said an each she which do their time if will way about many then them write "
+             "would like so these her long make thing see him two has look more day could go come").split()
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    text = []
+    length = 0
+    while length < size:
+        sentence = " ".join(rng.choices(words, weights, k=rng.randint(4, 15))).capitalize() + ". "
+        text.append(sentence)
+        length += len(sentence)
+    return "".join(text)[:size]
+
 
+def benchmark_packed(size_mb=100):
+    """ Real compression ratio and encode / decode speed of the packed format on size_mb MB of text """
+    data = _sample_text(size_mb * 2**20)
+    
+    t0 = time.perf_counter()
+    payload, bit_length, _, encoding_dict = huffman_encoding_packed(data)
+    encode_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    decoded = huffman_decoding_packed(payload, bit_length, encoding_dict)
+    decode_time = time.perf_counter() - t0
+    assert decoded == data
+    
+    print("input:  {} bytes, packed output: {} bytes".format(len(data), len(payload)))
+    print("compression ratio: {:.3f} (output / input)".format(len(payload) / len(data)))
+    print("encode: {:.1f} MB/s, decode: {:.1f} MB/s".format(size_mb / encode_time, size_mb / decode_time))
 
 
 def huffman_decoding(data, tree, encoding_dict):
@@ -234,6 +980,327 @@ def huffman_decoding(data, tree, encoding_dict):
 
 
 
+def benchmark_decoding(size_mb=1):
+    """ Decoding throughput: original huffman_decoding (0/1 string), trie walk and DecodeTable """
+    data = _sample_text(size_mb * 2**20)
+    encoded, tree, encoding_dict = huffman_encoding(data)
+    payload, bit_length, _, packed_dict = huffman_encoding_packed(data)
+    
+    runs = (("huffman_decoding", lambda: huffman_decoding(encoded, tree, encoding_dict)),
+            ("trie walk", lambda: _decoding_trie(payload, bit_length, packed_dict)),
+            ("DecodeTable", lambda: huffman_decoding_packed(payload, bit_length, packed_dict)))
+    for name, run in runs:
+        t0 = time.perf_counter()
+        decoded = run()
+        elapsed = time.perf_counter() - t0
+        assert decoded == data
+        print("{:<17} {:>8.2f} MB/s".format(name, size_mb / elapsed))
+
+
+def benchmark_stream(size_mb=100, chunk_size=1 << 20):
+    """ Streaming compression of a size_mb MB text file (written to a temporary directory)
+        to disk and back. Prints MB/s of both directions and the peak traced memory of compression.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        text_path = os.path.join(directory, "input.txt")
+        packed_path = os.path.join(directory, "input.huf")
+        restored_path = os.path.join(directory, "restored.txt")
+        block = _sample_text(2**20)
+        with open(text_path, "w", encoding="utf-8", newline="") as file:
+            for _ in range(size_mb):
+                file.write(block)
+        
+        t0 = time.perf_counter()
+        with open(text_path, encoding="utf-8", newline="") as source, open(packed_path, "wb") as target:
+            compress_stream(source, target, chunk_size)
+        encode_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        with open(packed_path, "rb") as source, open(restored_path, "w", encoding="utf-8", newline="") as target:
+            decompress_stream(source, target)
+        decode_time = time.perf_counter() - t0
+        tracemalloc.start()     # separate pass, tracing slows the timed runs down several times
+        with open(text_path, encoding="utf-8", newline="") as source, open(packed_path, "wb") as target:
+            compress_stream(source, target, chunk_size)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        
+        print("compressed {} MB to {:.1f} MB".format(size_mb, os.path.getsize(packed_path) / 2**20))
+        print("encode: {:.1f} MB/s, decode: {:.1f} MB/s, peak memory: {:.1f} MB".format(
+            size_mb / encode_time, size_mb / decode_time, peak / 2**20))
+        with open(text_path, "rb") as original, open(restored_path, "rb") as restored:
+            assert original.read() == restored.read()
+
+
+def benchmark_blocks(size_mb=64, block_size=1 << 20, max_workers=None):
+    """ Scaling of compress_blocks / decompress_blocks on size_mb MB of text from 1 worker process up to
+        max_workers (default: number of cores), doubling each step. Prints MB/s and speedup.
+    """
+    data = _sample_text(size_mb * 2**20)
+    max_workers = max_workers or os.cpu_count() or 1
+    workers = 1
+    base = None
+    while True:
+        t0 = time.perf_counter()
+        blob = compress_blocks(data, block_size, workers)
+        encode_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        assert decompress_blocks(blob, workers) == data
+        decode_time = time.perf_counter() - t0
+        base = base or (encode_time, decode_time)
+        print("{:3} workers: encode {:6.1f} MB/s (x{:.2f}), decode {:6.1f} MB/s (x{:.2f})".format(
+            workers, size_mb / encode_time, base[0] / encode_time, size_mb / decode_time, base[1] / decode_time))
+        if workers >= max_workers:
+            break
+        workers = min(workers * 2, max_workers)
+
+
+def benchmark_counting(size_mb=64):
+    """ Frequency counting throughput on size_mb MB of text and of bytes: the original per char dict
+        loop against count_freq (collections.Counter for str, _count_bytes for bytes)
+    """
+    text = _sample_text(size_mb * 2**20)
+    binary = text.encode("utf-8")
+    
+    def dict_loop(data):
+        count_dict = {}
+        for char in data:
+            count_dict[char] = count_dict.get(char, 0) + 1
+    
+    for name, data in (("str", text), ("bytes", binary)):
+        t0 = time.perf_counter()
+        dict_loop(data)
+        loop_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        HuffmanHeap().count_freq(data)
+        count_time = time.perf_counter() - t0
+        print("{:5}: dict loop {:7.1f} MB/s, count_freq {:7.1f} MB/s{}".format(
+            name, size_mb / loop_time, size_mb / count_time,
+            " (numpy)" if name == "bytes" and numpy is not None else ""))
+
+
+def benchmark_tree_builders(sizes=(2, 16, 256, 4096, 65536), repeat=5):
+    """ Tree construction time for alphabets of 2 to 65536 chars with Zipf-like frequencies:
+        HuffmanHeap (init_insert + heap_sort) against build_tree with heapq (shuffled frequencies)
+        and with the two-queue method (sorted frequencies). Best of repeat runs in ms.
+    """
+    rng = random.Random(42)
+    for size in sizes:
+        frequencies = [1 + 10**6 // rank for rank in range(1, size + 1)]
+        rng.shuffle(frequencies)
+        shuffled = dict(enumerate(frequencies))
+        ascending = dict(sorted(shuffled.items(), key=lambda item: item[1]))
+        
+        def heap_class():
+            tree = HuffmanHeap()
+            tree.count_dict = shuffled
+            tree.init_insert()
+            tree.heap_sort()
+        
+        timings = []
+        for build in (heap_class, lambda: build_tree(shuffled), lambda: build_tree(ascending)):
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                build()
+                best = min(best, time.perf_counter() - t0)
+            timings.append(best * 1000)
+        print("{:6} chars: HuffmanHeap {:9.3f} ms, heapq {:8.3f} ms, two-queue {:8.3f} ms".format(size, *timings))
+
+
+def benchmark_codebook(messages=20000):
+    """ Messages per second and average size for short messages: a tree per message (huffman_compress)
+        against a codebook trained on a separate corpus (compress_message / decompress_message)
+    """
+    corpus = _sample_text(2**20, seed=1)
+    sample = _sample_text(messages * 60, seed=2)
+    batch = [sample[i:i+60] for i in range(0, len(sample), 60)]
+    codebook = Codebook.train(corpus)
+    cache = CodebookCache()
+    cache.add(codebook)
+    
+    t0 = time.perf_counter()
+    blobs = [huffman_compress(message) for message in batch]
+    encode_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    assert [huffman_decompress(blob) for blob in blobs] == batch
+    decode_time = time.perf_counter() - t0
+    print("tree per message: encode {:8.0f} msg/s, decode {:8.0f} msg/s, {:.1f} bytes/msg".format(
+        len(batch) / encode_time, len(batch) / decode_time, sum(map(len, blobs)) / len(batch)))
+    
+    t0 = time.perf_counter()
+    blobs = [compress_message(message, codebook) for message in batch]
+    encode_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    assert [decompress_message(blob, cache) for blob in blobs] == batch
+    decode_time = time.perf_counter() - t0
+    print("codebook:         encode {:8.0f} msg/s, decode {:8.0f} msg/s, {:.1f} bytes/msg".format(
+        len(batch) / encode_time, len(batch) / decode_time, sum(map(len, blobs)) / len(batch)))
+
+
+CORPORA = ("uniform", "zipf", "english", "binary", "single")
+BENCHMARK_SIZES = (2**10, 2**20, 2**24, 2**30)      # 1 KB to 1 GB
+STREAM_SIZE = 2**26         # from this size on benchmark_suite goes through files and compress_stream
+TRACE_SIZE = 2**24          # part of a streamed corpus traced for the peak memory
+
+
+def _make_corpus(name, size, seed=42):
+    """ Synthetic input of size chars (bytes for "binary"): uniform printable ASCII, Zipf distributed
+        chars over 256 code points, pseudo English text, random bytes or a single repeated char
+    """
+    return ("" if name != "binary" else b"").join(_corpus_chunks(name, size, seed))
+
+
+def _corpus_chunks(name, size, seed=42, chunk_size=1 << 20):
+    """ _make_corpus in pieces of chunk_size, so large corpora can be written to a file piece by piece """
+    if name not in CORPORA:
+        raise ValueError("Unknown corpus {!r}, choose from {}".format(name, CORPORA))
+    rng = random.Random(seed)
+    chars = [chr(code) for code in range(32, 127)]
+    if name == "zipf":
+        chars = [chr(code) for code in range(32, 288)]
+        weights = [1 / rank for rank in range(1, len(chars) + 1)]
+    for index, start in enumerate(range(0, size, chunk_size)):
+        length = min(chunk_size, size - start)
+        if name == "uniform":
+            yield "".join(rng.choices(chars, k=length))
+        elif name == "zipf":
+            yield "".join(rng.choices(chars, weights, k=length))
+        elif name == "english":
+            yield _sample_text(length, seed + index)
+        elif name == "binary":
+            yield rng.randbytes(length)
+        else:
+            yield "a" * length
+
+
+def benchmark_suite(corpora=CORPORA, sizes=BENCHMARK_SIZES, profile=None, json_path=None):
+    """ Round trip every corpus at every size. Sizes below STREAM_SIZE are compressed in memory with
+        huffman_compress / huffman_decompress; larger ones are written to a temporary file piece by piece
+        and go through compress_stream / decompress_stream, so the 1 GB corpora fit into memory.
+        Reports the compression ratio (compressed bytes / input bytes, header included), encode and
+        decode MB/s and the peak traced memory of a separate round trip (tracing slows the timed runs
+        down; for streamed corpora it covers the first TRACE_SIZE chars, the memory use of streaming
+        does not grow with the input).
+        profile="cprofile" prints the top functions of the traced round trip, profile="tracemalloc" the
+        top allocation sites. With json_path the results are written there as a JSON list.
+        Returns the results as a list of dicts.
+    """
+    if profile not in (None, "cprofile", "tracemalloc"):
+        raise ValueError("profile must be None, 'cprofile' or 'tracemalloc'")
+    results = []
+    for name in corpora:
+        for size in sizes:
+            if size < STREAM_SIZE:
+                result = _benchmark_in_memory(name, size, profile)
+            else:
+                result = _benchmark_streamed(name, size, profile)
+            result["ratio"] = result["output_bytes"] / result["input_bytes"]
+            results.append(result)
+            print("{corpus:8} {size:>11} ({mode:6}): ratio {ratio:.3f}, encode {encode_mb_s:6.2f} MB/s, "
+                  "decode {decode_mb_s:6.2f} MB/s, peak {peak_memory_mb:8.1f} MB".format(**result))
+    
+    if json_path is not None:
+        with open(json_path, "w") as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+def _benchmark_in_memory(name, size, profile):
+    """ One benchmark_suite case with huffman_compress / huffman_decompress """
+    data = _make_corpus(name, size)
+    input_bytes = len(data) if isinstance(data, bytes) else len(data.encode("utf-8", "surrogatepass"))
+    t0 = time.perf_counter()
+    blob = huffman_compress(data)
+    encode_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    assert huffman_decompress(blob) == data
+    decode_time = time.perf_counter() - t0
+    
+    def round_trip():
+        traced = huffman_compress(data)
+        return huffman_decompress(traced), traced     # keep both alive for the snapshot
+    
+    peak = _traced_run(round_trip, name, size, profile)
+    return {"corpus": name, "size": size, "mode": "memory", "input_bytes": input_bytes,
+            "output_bytes": len(blob), "encode_mb_s": input_bytes / 2**20 / encode_time,
+            "decode_mb_s": input_bytes / 2**20 / decode_time, "peak_memory_mb": peak / 2**20}
+
+
+def _benchmark_streamed(name, size, profile):
+    """ One benchmark_suite case with compress_stream / decompress_stream on temporary files """
+    binary = name == "binary"
+    
+    def open_text(path, mode):
+        if binary:
+            return open(path, mode + "b")
+        return open(path, mode, encoding="utf-8", newline="")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        text_path = os.path.join(directory, "input")
+        packed_path = os.path.join(directory, "input.huf")
+        restored_path = os.path.join(directory, "restored")
+        with open_text(text_path, "w") as file:
+            for chunk in _corpus_chunks(name, size):
+                file.write(chunk)
+        
+        t0 = time.perf_counter()
+        with open_text(text_path, "r") as source, open(packed_path, "wb") as target:
+            compress_stream(source, target)
+        encode_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        with open(packed_path, "rb") as source, open_text(restored_path, "w") as target:
+            decompress_stream(source, target)
+        decode_time = time.perf_counter() - t0
+        assert _same_file(text_path, restored_path)
+        input_bytes = os.path.getsize(text_path)
+        output_bytes = os.path.getsize(packed_path)
+        
+        with open_text(text_path, "r") as file:
+            prefix = file.read(TRACE_SIZE)
+        
+        def round_trip():
+            source = io.BytesIO(prefix) if binary else io.StringIO(prefix)
+            with open(packed_path, "w+b") as packed, open_text(restored_path, "w") as target:
+                compress_stream(source, packed)
+                packed.seek(0)
+                decompress_stream(packed, target)
+        
+        peak = _traced_run(round_trip, name, size, profile)
+    return {"corpus": name, "size": size, "mode": "stream", "input_bytes": input_bytes,
+            "output_bytes": output_bytes, "encode_mb_s": input_bytes / 2**20 / encode_time,
+            "decode_mb_s": input_bytes / 2**20 / decode_time, "peak_memory_mb": peak / 2**20}
+
+
+def _traced_run(round_trip, name, size, profile):
+    """ Run round_trip under tracemalloc (and cProfile if asked), print the profile, return the peak """
+    tracemalloc.start()
+    kept = round_trip()
+    if profile == "tracemalloc":
+        print("--- {} {} bytes: top allocations ---".format(name, size))
+        for stat in tracemalloc.take_snapshot().statistics("lineno")[:10]:
+            print(stat)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del kept
+    if profile == "cprofile":
+        print("--- {} {} bytes ---".format(name, size))
+        profiler = cProfile.Profile()
+        profiler.runcall(round_trip)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    return peak
+
+
+def _same_file(path, other_path, block_size=1 << 20):
+    """ True if both files have the same content, compared block by block """
+    with open(path, "rb") as file, open(other_path, "rb") as other:
+        while True:
+            block = file.read(block_size)
+            if block != other.read(block_size):
+                return False
+            if not block:
+                return True
+
+
 ### Own tests ###
 
 print("Test case 1 ----------")
@@ -313,6 +1380,121 @@ print("----------------------")
 #Decoded: aaaaaaaaaaaaaaaaaaaaaaaaaaa
 
 
+print("Test case 6 (packed bits) ----------")
+sentence = "Udacity is great for python learning"
+payload, bit_length, tree, encoding_dict = huffman_encoding_packed(sentence)
+print("Encoded size:", len(payload), "bytes,", bit_length, "bits")
+print("Decoded:", huffman_decoding_packed(payload, bit_length, encoding_dict))
+print("----------------------")
+
+#Test case 6 (packed bits) ----------
+#Encoded size: 18 bytes, 144 bits
+#Decoded: Udacity is great for python learning
+#----------------------
+
+
+print("Test case 7 (self-describing bytes) ----------")
+sentence = "Sebastian Thrun likes self-driving cars"
+blob = huffman_compress(sentence)
+print("Compressed size:", len(blob), "bytes, header:", len(blob) - (len(huffman_encoding(sentence)[0]) + 7) // 8, "bytes")
+print("Decoded:", huffman_decompress(blob))
+print("Empty:", repr(huffman_decompress(huffman_compress(""))))
+print("----------------------")
+
+#Test case 7 (self-describing bytes) ----------
+#Compressed size: 54 bytes, header: 33 bytes
+#Decoded: Sebastian Thrun likes self-driving cars
+#Empty: ''
+#----------------------
+
+
+print("Test case 8 (streaming) ----------")
+source = io.StringIO("Udacity is great for python learning\n" * 1000)
+target = io.BytesIO()
+print("Compressed size:", compress_stream(source, target, chunk_size=1000), "bytes")
+target.seek(0)
+restored = io.StringIO()
+decompress_stream(target, restored)
+print("Decoded equal:", restored.getvalue() == source.getvalue())
+print("----------------------")
+
+#Test case 8 (streaming) ----------
+#Compressed size: 19006 bytes
+#Decoded equal: True
+#----------------------
+
+
+print("Test case 9 (blocks) ----------")
+data = "".join("line {} of the log archive\n".format(i) for i in range(200))
+# in-process: a pool started while the module runs (or is imported) can deadlock or rerun this script
+blob = compress_blocks(data, block_size=1000, workers=1)
+print("Blocks:", len(_read_block_index(blob)))
+print("Decoded equal:", decompress_blocks(blob, workers=1) == data)
+print("Block 3 equal:", read_block(blob, 3) == data[3000:4000])
+print("----------------------")
+
+#Test case 9 (blocks) ----------
+#Blocks: 6
+#Decoded equal: True
+#Block 3 equal: True
+#----------------------
+
+
+print("Test case 10 (bytes) ----------")
+data = bytes(range(256)) + b"\x00\xff" * 100
+blob = huffman_compress(data)
+print("Compressed size:", len(blob), "bytes")
+print("Decoded equal:", huffman_decompress(blob) == data)
+print("----------------------")
+
+#Test case 10 (bytes) ----------
+#Compressed size: 737 bytes
+#Decoded equal: True
+#----------------------
+
+
+print("Test case 11 (tree builders) ----------")
+counts = {char: ord(char) % 7 + 1 for char in "The quick brown fox jumps over the lazy dog"}
+ascending = dict(sorted(counts.items(), key=lambda item: item[1]))
+print("Same code lengths:", code_lengths(build_tree(ascending)) == code_lengths(_heapq_tree(
+    [HuffmanNode(char, frequency) for char, frequency in ascending.items()])))
+skewed = {i: 2**i for i in range(1500)}     # 1500 levels deep, too deep for recursion
+print("Longest code:", max(code_lengths(build_tree(skewed)).values()))
+print("----------------------")
+
+#Test case 11 (tree builders) ----------
+#Same code lengths: True
+#Longest code: 1499
+#----------------------
+
+
+print("Test case 12 (codebook) ----------")
+codebook = Codebook.train(["Udacity is great for python learning", "The bird is the word"], codebook_id=7)
+cache = CodebookCache(capacity=2)
+cache.add(Codebook.from_bytes(codebook.to_bytes(), codebook_id=7))
+for message in ("great python bird", "Déjà vu!"):     # the second one needs escapes
+    blob = compress_message(message, codebook)
+    print(len(blob), "bytes:", decompress_message(blob, cache))
+print("----------------------")
+
+#Test case 12 (codebook) ----------
+#12 bytes: great python bird
+#27 bytes: Déjà vu!
+#----------------------
+
+
+### Benchmarks ### (uncomment to run, takes a while)
+
+# benchmark_packed()
+# benchmark_decoding()
+# benchmark_stream()
+# benchmark_blocks()      # starts worker processes, see _block_executor
+# benchmark_counting()
+# benchmark_tree_builders()
+# benchmark_codebook()
+# benchmark_suite(sizes=(2**10, 2**20), json_path="benchmark_task3.json")
+
+
 # Returns assertion error, as string is empty
 print("Test case 5 ----------")
 sentence = ""
@@ -1,14 +1,32 @@
+import random
+import time
+
+
 class Group(object):
+    """ Group of users and subgroups.
+        PARAMETERS:
+        ==========
+            self.groups / self.users = direct subgroups and users
+            self.parents = groups this group was added to, to update their indices
+            self.members = membership index: set of all users of this group and (transitively)
+                           of all its subgroups, kept up to date by add_user / add_group
+    """
+    
     def __init__(self, _name):
         self.name = _name
         self.groups = []
         self.users = []
+        self.parents = []
+        self.members = set()
     
     def add_group(self, group):
         self.groups.append(group)
+        group.parents.append(self)
+        self._propagate(group.members)
     
     def add_user(self, user):
         self.users.append(user)
+        self._propagate({user})
     
     def get_groups(self):
         return self.groups
@@ -18,25 +36,170 @@ class Group(object):
     
     def get_name(self):
         return self.name
+    
+    def _propagate(self, users):
+        """ Add users to the index of this group and of all its ancestors. An ancestor that already
+            has all of them is not walked further: its own ancestors include them as well.
+        """
+        stack = [self]
+        while stack:
+            group = stack.pop()
+            new_users = users - group.members
+            if new_users:
+                group.members |= new_users
+                stack.extend(group.parents)
 
 
 def is_user_in_group(user, group):
     """
         Return True if user is in the group, False otherwise.
+        Looks the user up in the membership index of the group (O(1)).
         
         Args:
         user(str): user name/id
         group(class:Group): group to check user membership against
         """
     
+    return user in group.members
+
+
+def resolve_members(group):
+    """ Repair tool: recompute the membership index of group and all its subgroups from their users and
+        groups lists (e.g. after they were changed directly) and return the members of group. New members
+        are then pushed up to the ancestors, so every group still holds the members of its subgroups.
+        Costs the sizes of the member sets on top of the walk; for single checks without the index
+        use is_user_in_group_walk.
+        Iterative DFS with an explicit stack (Tarjan's strongly connected components), every group is
+        visited once: the members of a subgroup are resolved before its parents and reused by all of
+        them, so shared subgroups (diamonds) cost nothing extra, and groups in a cycle share one set.
+    """
+    order = {group: 0}      # DFS number of every visited group
+    low = {group: 0}        # lowest DFS number reachable, equal to order for the first group of a cycle
+    path = [group]          # visited groups whose component is not resolved yet
+    on_path = {group}
+    resolved = {}           # memo: group -> members
+    stack = [(group, iter(group.groups))]
+    while stack:
+        node, subgroups = stack[-1]
+        for subgroup in subgroups:
+            if subgroup not in order:
+                order[subgroup] = low[subgroup] = len(order)
+                path.append(subgroup)
+                on_path.add(subgroup)
+                stack.append((subgroup, iter(subgroup.groups)))
+                break
+            if subgroup in on_path:     # cycle back to a group on the path
+                low[node] = min(low[node], order[subgroup])
+        else:
+            stack.pop()
+            if stack:
+                parent = stack[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == order[node]:
+                # node and the groups above it on path form a cycle (or node alone): resolve them together
+                component = []
+                while not component or component[-1] is not node:
+                    component.append(path.pop())
+                    on_path.discard(component[-1])
+                members = set()
+                for member in component:
+                    members.update(member.users)
+                    for subgroup in member.groups:
+                        if subgroup in resolved:
+                            members |= resolved[subgroup]
+                for member in component:
+                    resolved[member] = members
+                    # groups of a cycle need their own sets, _propagate stops at a group that has the users
+                    member.members = members if len(component) == 1 else set(members)
+    
+    # ancestors outside the resolved groups may miss users that were added to the lists directly
+    for member in resolved:
+        for parent in member.parents:
+            if parent not in resolved:
+                parent._propagate(member.members)
+    return group.members
+
+
+def is_user_in_group_walk(user, group, memo=None):
+    """ Membership without the index: iterative DFS over the subgroups with an explicit stack and a
+        visited set, so every group and subgroup link is looked at once at most (O(groups + links)), also
+        for shared subgroups (diamonds) and cycles.
+        memo is a dict group -> result for this user. Pass the same dict to check the same user against
+        several groups: groups resolved by an earlier call are not walked again.
+    """
+    if memo is None:
+        memo = {}
+    if group in memo:
+        return memo[group]
     if user in group.users:
+        memo[group] = True
         return True
-    
-    else:
-        subgroups = [c for c in group.groups]
+    visited = {group}
+    path = [(group, iter(group.groups))]    # groups from group down to the one being walked
+    while path:
+        node, subgroups = path[-1]
         for subgroup in subgroups:
-            return is_user_in_group(user, subgroup)
-        return False
+            if subgroup in visited or memo.get(subgroup) is False:
+                continue
+            if memo.get(subgroup) or user in subgroup.users:
+                # found: every group on the path contains the user
+                memo[subgroup] = True
+                for node, _ in path:
+                    memo[node] = True
+                return True
+            visited.add(subgroup)
+            path.append((subgroup, iter(subgroup.groups)))
+            break
+        else:
+            path.pop()
+    # nothing reachable from group contains the user, so no visited group does
+    for node in visited:
+        memo[node] = False
+    return False
+
+
+def benchmark_membership(num_groups=10**5, queries=10**5, walk_queries=100, parents_per_group=2):
+    """ Random org chart of num_groups groups with one user each, every group added to parents_per_group
+        random earlier groups (a DAG with heavy sharing): time to build it (index updates included),
+        time of the resolve_members repair for the top group, lookups per second with the index and with
+        is_user_in_group_walk for the top group, and one user checked against every group with a shared memo
+    """
+    rng = random.Random(42)
+    t0 = time.perf_counter()
+    groups = [Group("group0")]
+    groups[0].add_user("user0")
+    for i in range(1, num_groups):
+        group = Group("group{}".format(i))
+        for parent in set(rng.randrange(i) for _ in range(parents_per_group)):
+            groups[parent].add_group(group)
+        group.add_user("user{}".format(i))
+        groups.append(group)
+    print("built {} groups in {:.2f} s".format(num_groups, time.perf_counter() - t0))
+    
+    indexed = groups[0].members
+    t0 = time.perf_counter()
+    assert resolve_members(groups[0]) == indexed
+    print("resolve_members: {:.2f} s".format(time.perf_counter() - t0))
+    
+    root = groups[0]
+    users = ["user{}".format(rng.randrange(num_groups * 2)) for _ in range(queries)]  # half are missing
+    t0 = time.perf_counter()
+    found = sum(is_user_in_group(user, root) for user in users)
+    index_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    assert sum(is_user_in_group_walk(user, root) for user in users[:walk_queries]) == \
+        sum(is_user_in_group(user, root) for user in users[:walk_queries])
+    walk_time = time.perf_counter() - t0
+    print("index: {:.0f} lookups/s ({} of {} found), walk: {:.0f} lookups/s".format(
+        queries / index_time, found, queries, walk_queries / walk_time))
+    
+    user = "user{}".format(num_groups - 1)
+    memo = {}
+    t0 = time.perf_counter()
+    found = sum(is_user_in_group_walk(user, group, memo) for group in groups)
+    assert found == sum(is_user_in_group(user, group) for group in groups)
+    print("walk with memo: {} against all {} groups in {:.2f} s ({} contain it)".format(
+        user, num_groups, time.perf_counter() - t0, found))
 
 
 ### Official test cases ###
@@ -69,3 +232,47 @@ print(is_user_in_group(user = "parent", group=sub_child))
 
 
 
+
+print("====================")
+
+print("Index updates:")
+other = Group("other")
+other.add_group(parent)     # existing members of parent count for other as well
+print(is_user_in_group(user = "sub_child_user", group=other))
+# True
+sub_child.add_user("late_user")     # added after the groups were connected
+print(is_user_in_group(user = "late_user", group=other))
+# True
+print(is_user_in_group(user = "late_user", group=Group("empty")))
+# False
+
+
+print("====================")
+
+print("Diamonds and cycles:")
+top, left, right, bottom = Group("top"), Group("left"), Group("right"), Group("bottom")
+top.add_group(left)
+top.add_group(right)
+left.add_group(bottom)
+right.add_group(bottom)     # diamond: bottom is shared
+bottom.add_user("bottom_user")
+bottom.add_group(top)       # cycle: bottom -> top -> left -> bottom
+top.add_user("top_user")
+print(is_user_in_group(user = "top_user", group=bottom))
+# True
+bottom.users.append("direct_user")  # changed without add_user, the index does not know it
+print(sorted(resolve_members(left)))
+# ['bottom_user', 'direct_user', 'top_user']
+print(is_user_in_group_walk("nobody", bottom))
+# False
+
+root, child = Group("root"), Group("child")
+root.add_group(child)
+child.users.append("x")
+resolve_members(child)      # the repair reaches the ancestors as well
+child.add_user("x")
+print(is_user_in_group(user = "x", group=root), is_user_in_group_walk("x", root))
+# True True
+
+### Benchmark ### (uncomment to run)
+# benchmark_membership()